@@ -5,14 +5,20 @@ Audit module for tracking document conversions in SQLite.
 from .db import (
     init_db,
     get_db,
+    get_db_ro,
     insert_job,
     update_job_status,
     update_job_started,
+    update_batch_started,
     update_job_complete,
+    update_job_analysis,
+    flush_audit,
+    close_db,
     get_job,
     get_active_jobs,
     get_all_active_jobs,
     get_user_history,
+    get_user_history_page,
     search_user_history,
     get_user_stats,
     get_queue_stats,
@@ -38,25 +44,35 @@ from .errors import (
 # LLM postprocessing (optional - requires litellm)
 try:
     from .llm_postprocess import (
+        analyze_document,
         analyze_document_sync,
         AnalysisResult,
+        PROMPT_VERSION,
     )
 except ImportError:
+    analyze_document = None
     analyze_document_sync = None
     AnalysisResult = None
+    PROMPT_VERSION = None
 
 __all__ = [
     # Database functions
     "init_db",
     "get_db",
+    "get_db_ro",
     "insert_job",
     "update_job_status",
     "update_job_started",
+    "update_batch_started",
     "update_job_complete",
+    "update_job_analysis",
+    "flush_audit",
+    "close_db",
     "get_job",
     "get_active_jobs",
     "get_all_active_jobs",
     "get_user_history",
+    "get_user_history_page",
     "search_user_history",
     "get_user_stats",
     "get_queue_stats",
@@ -76,6 +92,8 @@ __all__ = [
     "invalid_parameter_error",
     "internal_error",
     # LLM Postprocessing
+    "analyze_document",
     "analyze_document_sync",
     "AnalysisResult",
+    "PROMPT_VERSION",
 ]
@@ -8,21 +8,233 @@ This module provides functions to:
 - Query job history and statistics
 """
 
+import atexit
+import base64
+import itertools
 import json
 import logging
 import os
 import sqlite3
-from dataclasses import dataclass, field
+import threading
+from collections import deque
+from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
 # Database path - can be overridden via environment variable
 DB_PATH = os.getenv("MDCONVERT_AUDIT_DB", "/opt/mdconvert/data/audit.db")
 
+# ":memory:" (or "") gives a private database per connection - used for tests and local runs
+_IN_MEMORY = DB_PATH in ("", ":memory:")
+
+# Per-connection tuning. WAL lets readers run alongside the writer, and with WAL
+# synchronous=NORMAL only fsyncs on checkpoint instead of on every commit.
+_PRAGMAS = [
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",  # 64 MB
+    "PRAGMA busy_timeout=30000",  # several worker processes write to the same file
+]
+
+# File-only tuning: meaningless for an in-memory database
+_FILE_PRAGMAS = [
+    "PRAGMA mmap_size=268435456",  # 256 MB
+]
+
+# journal_mode is persisted in the database file, so it only needs setting once per process
+_INIT_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+]
+
+_initialized = False
+
+# One connection per thread, reused across calls instead of reopening the DB each time
+_tls = threading.local()
+# An in-memory database only exists inside its connection, so all threads share one
+_memory_conn: Optional[sqlite3.Connection] = None
+# (pid, thread id, connection) of the cached connections - for closing them
+_connections: List[Tuple[int, int, sqlite3.Connection]] = []
+_connections_lock = threading.Lock()
+# Bumped by _close_connections - cached connections of an older generation are not reused
+_generation = 0
+
+# Write-behind queue: writers enqueue (sql, params) and a background thread commits
+# everything that accumulated within _FLUSH_INTERVAL seconds in a single transaction
+_FLUSH_INTERVAL = 0.05
+# A burst that reaches this many queued writes is flushed without waiting out the interval
+_FLUSH_MAX_ROWS = 100
+# Bound on queued writes, so a stalled database cannot grow the queue without limit -
+# beyond it writes are dropped (audit writes are best-effort for the callers anyway)
+_MAX_QUEUED_WRITES = 10_000
+_write_queue: "deque[Tuple[str, tuple]]" = deque()
+_write_queue_cond = threading.Condition()
+# Held while a batch is taken from the queue and written, so batches commit in queue order
+_write_lock = threading.Lock()
+_flusher_thread: Optional[threading.Thread] = None
+# Set by close_db - the flusher writes what is queued, closes its connection and exits
+_flusher_stopping = False
+
+
+# SQL statements - kept as module constants so every call reuses the same
+# prepared statement from the connection's statement cache
+
+# Columns read into JobStatus. The "[JSON]" column-name annotation makes sqlite3
+# (detect_types=PARSE_COLNAMES) decode tags with the registered JSON converter
+# while fetching rows, instead of in _row_to_job_status.
+_JOB_COLUMNS = """
+    job_id, user_id, filename, file_type, file_size, status,
+    created_at, started_at, completed_at, pages, processing_time_ms,
+    result_url, error, summary, category, tags AS "tags [JSON]", language
+"""
+
+# id is the rowid the full-text index refers to - an INTEGER PRIMARY KEY, because VACUUM may
+# renumber the implicit rowid of a table without one
+SQL_CREATE_CONVERSIONS = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        -- Identification
+        id INTEGER PRIMARY KEY,
+        job_id TEXT NOT NULL UNIQUE,
+        user_id TEXT NOT NULL,
+
+        -- File info
+        filename TEXT NOT NULL,
+        file_type TEXT,
+        file_size INTEGER,
+
+        -- Status
+        status TEXT DEFAULT 'PENDING',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        started_at TIMESTAMP,
+        completed_at TIMESTAMP,
+
+        -- Results
+        pages INTEGER,
+        processing_time_ms INTEGER,
+        result_url TEXT,
+        error TEXT,
+
+        -- LLM postprocessing
+        summary TEXT,
+        category TEXT,
+        tags TEXT,
+        language TEXT
+    )
+"""
+
+SQL_INSERT_JOB = """
+    INSERT INTO conversions (job_id, user_id, filename, file_type, file_size, status)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+SQL_UPDATE_STATUS = "UPDATE conversions SET status = ? WHERE job_id = ?"
+
+SQL_UPDATE_STARTED = """
+    UPDATE conversions
+    SET status = ?, started_at = CURRENT_TIMESTAMP
+    WHERE job_id = ?
+"""
+
+# Only the first document of a batch to start moves the batch job out of PENDING
+SQL_UPDATE_BATCH_STARTED = """
+    UPDATE conversions
+    SET status = ?, started_at = CURRENT_TIMESTAMP
+    WHERE job_id = ? AND status = ?
+"""
+
+# LLM metadata is only ever filled in - it may be written by the analysis task before this
+SQL_UPDATE_COMPLETE = """
+    UPDATE conversions SET
+        status = ?,
+        completed_at = CURRENT_TIMESTAMP,
+        pages = ?,
+        processing_time_ms = ?,
+        result_url = ?,
+        error = ?,
+        summary = COALESCE(?, summary),
+        category = COALESCE(?, category),
+        tags = COALESCE(?, tags),
+        language = COALESCE(?, language)
+    WHERE job_id = ?
+"""
+
+SQL_UPDATE_ANALYSIS = """
+    UPDATE conversions SET
+        summary = ?,
+        category = ?,
+        tags = ?,
+        language = ?
+    WHERE job_id = ?
+"""
+
+SQL_GET_JOB_FOR_USER = f"SELECT {_JOB_COLUMNS} FROM conversions WHERE job_id = ? AND user_id = ?"
+
+SQL_GET_JOB = f"SELECT {_JOB_COLUMNS} FROM conversions WHERE job_id = ?"
+
+# Active-job queries inline the status values so they can use the partial indexes
+SQL_GET_ACTIVE_JOBS = f"""
+    SELECT {_JOB_COLUMNS} FROM conversions
+    WHERE user_id = ? AND status IN ('PENDING', 'IN_PROGRESS')
+    ORDER BY created_at ASC
+"""
+
+SQL_GET_USER_HISTORY = f"""
+    SELECT {_JOB_COLUMNS} FROM conversions
+    WHERE user_id = ?
+      AND status IN (?, ?)
+      AND created_at >= datetime('now', '-' || ? || ' days')
+      AND (? IS NULL OR (created_at, job_id) < (?, ?))
+    ORDER BY created_at DESC, job_id DESC
+    LIMIT ?
+"""
+
+SQL_SEARCH_USER_HISTORY = f"""
+    SELECT {_JOB_COLUMNS} FROM conversions
+    WHERE id IN (SELECT rowid FROM conversions_fts WHERE conversions_fts MATCH ?)
+      AND user_id = ?
+      AND status IN (?, ?)
+    ORDER BY created_at DESC
+"""
+
+# One scan per user: totals are summed client-side from the per-file-type rows
+SQL_USER_STATS = """
+    SELECT
+        file_type,
+        COUNT(*) as count,
+        SUM(pages) as total_pages,
+        SUM(file_size) as total_files_size,
+        SUM(processing_time_ms) as total_processing_time_ms,
+        SUM(CASE WHEN status = ? THEN 1 ELSE 0 END) as success_count,
+        SUM(CASE WHEN status = ? THEN 1 ELSE 0 END) as failure_count
+    FROM conversions
+    WHERE user_id = ?
+    GROUP BY file_type
+"""
+
+# Single pass: active jobs via idx_status, last hour's successes via idx_recent_success.
+# Status values are inlined so the planner can match the partial index predicate.
+SQL_QUEUE_STATS = """
+    SELECT
+        SUM(CASE WHEN status = 'PENDING' THEN 1 ELSE 0 END) as pending_count,
+        SUM(CASE WHEN status = 'IN_PROGRESS' THEN 1 ELSE 0 END) as in_progress_count,
+        MIN(CASE WHEN status = 'PENDING' THEN created_at END) as oldest_pending,
+        AVG(CASE WHEN status = 'SUCCESS'
+            THEN (julianday(completed_at) - julianday(created_at)) * 24 * 60
+        END) as avg_wait_minutes
+    FROM conversions
+    WHERE status IN ('PENDING', 'IN_PROGRESS')
+       OR (status = 'SUCCESS' AND completed_at >= datetime('now', '-1 hour'))
+"""
+
+SQL_GET_ALL_ACTIVE_JOBS = f"""
+    SELECT {_JOB_COLUMNS} FROM conversions
+    WHERE status IN ('PENDING', 'IN_PROGRESS')
+    ORDER BY created_at ASC
+"""
+
 
 class Status(str, Enum):
     """Job status values."""
@@ -32,7 +244,7 @@ class Status(str, Enum):
     FAILURE = "FAILURE"
 
 
-@dataclass
+@dataclass(slots=True)
 class JobStatus:
     """
     Consistent job status structure used across all MCP tools.
@@ -60,63 +272,230 @@ class JobStatus:
 
     def to_dict(self, include_user_id: bool = False) -> Dict[str, Any]:
         """Convert to dictionary, excluding None values."""
-        result = {}
-        for key, value in self.__dict__.items():
-            if value is not None:
-                if key == "user_id" and not include_user_id:
-                    continue
-                if key == "tags" and isinstance(value, str):
-                    # Parse JSON string to list
-                    try:
-                        value = json.loads(value)
-                    except json.JSONDecodeError:
-                        value = []
-                result[key] = value
-        return result
+        if include_user_id:
+            return _job_status_to_dict_with_user(self)
+        return _job_status_to_dict(self)
+
+
+def _parse_tags(value: str) -> List[str]:
+    """Parse tags stored as a JSON string."""
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return []
+
+
+def _compile_job_status_to_dict(include_user_id: bool):
+    """
+    Generate a straight-line to_dict for JobStatus.
+
+    Unrolling the fields at import time avoids iterating and branching on
+    field names for every serialized job in list responses.
+    """
+    lines = ["def to_dict(self):", "    result = {}"]
+    for name in JobStatus.__dataclass_fields__:
+        if name == "user_id" and not include_user_id:
+            continue
+        lines.append(f"    value = self.{name}")
+        lines.append("    if value is not None:")
+        if name == "tags":
+            lines.append("        if isinstance(value, str):")
+            lines.append("            value = _parse_tags(value)")
+        lines.append(f"        result[{name!r}] = value")
+    lines.append("    return result")
+
+    namespace = {"_parse_tags": _parse_tags}
+    exec("\n".join(lines), namespace)
+    return namespace["to_dict"]
+
+
+_job_status_to_dict = _compile_job_status_to_dict(include_user_id=False)
+_job_status_to_dict_with_user = _compile_job_status_to_dict(include_user_id=True)
 
 
 def get_db() -> sqlite3.Connection:
-    """Get database connection with row factory."""
+    """
+    Get a new database connection with row factory.
+
+    The caller owns the connection and closes it when done. The audit functions
+    themselves use a connection per thread (_get_conn) instead of opening one per call.
+    """
+    if _IN_MEMORY:
+        # An in-memory database only exists inside its connection - hand out the shared one,
+        # which must not be closed
+        return _get_conn()
+    return _open_connection()
+
+
+def get_db_ro() -> sqlite3.Connection:
+    """Get a new read-only database connection with row factory - closed by the caller."""
+    if _IN_MEMORY:
+        return _get_conn()
+    return _open_ro_connection()
+
+
+def _open_connection() -> sqlite3.Connection:
+    global _initialized
+
     # Ensure directory exists
     Path(DB_PATH).parent.mkdir(parents=True, exist_ok=True)
 
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, cached_statements=256, detect_types=sqlite3.PARSE_COLNAMES)
+    conn.row_factory = sqlite3.Row
+
+    if not _initialized:
+        for pragma in _INIT_PRAGMAS:
+            conn.execute(pragma)
+        _initialized = True
+    for pragma in _PRAGMAS + _FILE_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def _open_ro_connection() -> sqlite3.Connection:
+    # A read-only connection cannot create the database file
+    _get_conn()
+
+    conn = sqlite3.connect(
+        Path(DB_PATH).absolute().as_uri() + "?mode=ro",
+        uri=True,
+        cached_statements=256,
+        detect_types=sqlite3.PARSE_COLNAMES,
+    )
     conn.row_factory = sqlite3.Row
+
+    for pragma in _PRAGMAS + _FILE_PRAGMAS:
+        conn.execute(pragma)
+    conn.execute("PRAGMA query_only=1")
+    return conn
+
+
+def _get_conn() -> sqlite3.Connection:
+    """
+    Get the calling thread's database connection.
+
+    The connection is opened lazily and reused for the lifetime of the thread.
+    Use it as `with conn:` for transaction handling - this commits/rolls back
+    but does not close the connection.
+    """
+    global _memory_conn
+
+    if _IN_MEMORY:
+        with _connections_lock:
+            if _memory_conn is None:
+                _memory_conn = sqlite3.connect(
+                    ":memory:",
+                    check_same_thread=False,
+                    cached_statements=256,
+                    detect_types=sqlite3.PARSE_COLNAMES,
+                )
+                _memory_conn.row_factory = sqlite3.Row
+                for pragma in _PRAGMAS:
+                    _memory_conn.execute(pragma)
+                _connections.append((os.getpid(), threading.get_ident(), _memory_conn))
+            return _memory_conn
+
+    conn = _cached_conn("conn")
+    if conn is None:
+        conn = _cache_conn("conn", _open_connection())
+    return conn
+
+
+def _get_ro_conn() -> sqlite3.Connection:
+    """
+    Get the calling thread's read-only database connection.
+
+    Used by the query functions so readers work off their own WAL snapshot and
+    never queue behind the write connection's transactions or checkpoints.
+    """
+    if _IN_MEMORY:
+        return _get_conn()
+
+    conn = _cached_conn("ro_conn")
+    if conn is None:
+        conn = _cache_conn("ro_conn", _open_ro_connection())
     return conn
 
 
+def _cached_conn(name: str) -> Optional[sqlite3.Connection]:
+    """The calling thread's cached connection of the given name, if it can still be used."""
+    conn = getattr(_tls, name, None)
+    if conn is None:
+        return None
+    owner_pid, generation = getattr(_tls, name + "_owner")
+    # Connections must not be shared with forked children (e.g. Celery prefork workers)
+    if owner_pid != os.getpid():
+        return None
+    if generation != _generation:
+        # close_db ran since - on another thread it could not close this thread's connection
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        return None
+    return conn
+
+
+def _cache_conn(name: str, conn: sqlite3.Connection) -> sqlite3.Connection:
+    setattr(_tls, name, conn)
+    setattr(_tls, name + "_owner", (os.getpid(), _generation))
+    with _connections_lock:
+        _connections.append((os.getpid(), threading.get_ident(), conn))
+    return conn
+
+
+def _close_connections() -> None:
+    """
+    Close the connections this process opened on the calling thread.
+
+    A connection can only be closed by its own thread - those of other threads are
+    invalidated instead and closed by their thread when it next needs one.
+    """
+    global _memory_conn, _generation
+    pid = os.getpid()
+    thread = threading.get_ident()
+    with _connections_lock:
+        _generation += 1
+        for owner_pid, owner_thread, conn in _connections:
+            if owner_pid != pid:
+                continue  # Inherited across fork - owned by the parent process
+            # The in-memory connection is shared between threads, so any thread may close it
+            if owner_thread != thread and conn is not _memory_conn:
+                continue
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _connections.clear()
+        _memory_conn = None
+
+
+def _close_thread_connections() -> None:
+    """Close the calling thread's cached connections."""
+    for name in ("conn", "ro_conn"):
+        conn = getattr(_tls, name, None)
+        if conn is None or getattr(_tls, name + "_owner")[0] != os.getpid():
+            continue
+        delattr(_tls, name)
+        with _connections_lock:
+            _connections[:] = [entry for entry in _connections if entry[2] is not conn]
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
 def init_db() -> None:
     """Initialize database schema."""
-    with get_db() as conn:
-        conn.executescript("""
-            CREATE TABLE IF NOT EXISTS conversions (
-                -- Identification
-                job_id TEXT PRIMARY KEY,
-                user_id TEXT NOT NULL,
-
-                -- File info
-                filename TEXT NOT NULL,
-                file_type TEXT,
-                file_size INTEGER,
-
-                -- Status
-                status TEXT DEFAULT 'PENDING',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                started_at TIMESTAMP,
-                completed_at TIMESTAMP,
-
-                -- Results
-                pages INTEGER,
-                processing_time_ms INTEGER,
-                result_url TEXT,
-                error TEXT,
-
-                -- LLM postprocessing
-                summary TEXT,
-                category TEXT,
-                tags TEXT,
-                language TEXT
-            );
+    conn = _get_conn()
+    with conn:
+        rebuilt = _add_stable_id(conn)
+        fts_exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'conversions_fts'"
+        ).fetchone() is not None
+
+        conn.executescript(f"""
+            {SQL_CREATE_CONVERSIONS.format(table="conversions")};
 
             CREATE INDEX IF NOT EXISTS idx_user_created
                 ON conversions(user_id, created_at DESC);
@@ -124,9 +503,83 @@ def init_db() -> None:
                 ON conversions(status);
             CREATE INDEX IF NOT EXISTS idx_user_status
                 ON conversions(user_id, status);
+            CREATE INDEX IF NOT EXISTS idx_recent_success
+                ON conversions(completed_at) WHERE status = 'SUCCESS';
+            CREATE INDEX IF NOT EXISTS idx_active_user
+                ON conversions(user_id, created_at) WHERE status IN ('PENDING', 'IN_PROGRESS');
+            CREATE INDEX IF NOT EXISTS idx_active_created
+                ON conversions(created_at) WHERE status IN ('PENDING', 'IN_PROGRESS');
+
+            -- Full-text index for search_user_history (external content, kept in sync by triggers)
+            CREATE VIRTUAL TABLE IF NOT EXISTS conversions_fts USING fts5(
+                filename, summary, tags,
+                content='conversions', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            );
+
+            CREATE TRIGGER IF NOT EXISTS conversions_fts_ai AFTER INSERT ON conversions BEGIN
+                INSERT INTO conversions_fts(rowid, filename, summary, tags)
+                VALUES (new.id, new.filename, new.summary, new.tags);
+            END;
+            CREATE TRIGGER IF NOT EXISTS conversions_fts_ad AFTER DELETE ON conversions BEGIN
+                INSERT INTO conversions_fts(conversions_fts, rowid, filename, summary, tags)
+                VALUES ('delete', old.id, old.filename, old.summary, old.tags);
+            END;
+            CREATE TRIGGER IF NOT EXISTS conversions_fts_au
+                AFTER UPDATE OF filename, summary, tags ON conversions BEGIN
+                INSERT INTO conversions_fts(conversions_fts, rowid, filename, summary, tags)
+                VALUES ('delete', old.id, old.filename, old.summary, old.tags);
+                INSERT INTO conversions_fts(rowid, filename, summary, tags)
+                VALUES (new.id, new.filename, new.summary, new.tags);
+            END;
         """)
+
+        if not fts_exists:
+            # Index rows written before the FTS table existed (or before the table was rebuilt)
+            conn.execute("INSERT INTO conversions_fts(conversions_fts) VALUES ('rebuild')")
+
+        # Gather planner statistics once so it can choose between the (partial) indexes
+        has_stats = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+        ).fetchone() is not None
+        conn.execute("PRAGMA optimize" if has_stats else "ANALYZE")
         logger.info(f"Database initialized at {DB_PATH}")
 
+    if rebuilt:
+        logger.info("Rebuilt the conversions table with a stable id column")
+    _ensure_flusher()
+
+
+def _add_stable_id(conn: sqlite3.Connection) -> bool:
+    """
+    Rebuild a conversions table created without the id column, keeping each row's rowid as its id.
+
+    Returns whether the table was rebuilt. The full-text index is dropped with it and
+    recreated by init_db.
+    """
+    # Immediate - another process starting up must not rebuild the table at the same time
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(conversions)")]
+        if not columns or "id" in columns:
+            conn.rollback()
+            return False
+
+        copied = ", ".join(columns)
+        for statement in (
+            SQL_CREATE_CONVERSIONS.format(table="conversions_new"),
+            f"INSERT INTO conversions_new (id, {copied}) SELECT rowid, {copied} FROM conversions",
+            "DROP TABLE IF EXISTS conversions_fts",
+            "DROP TABLE conversions",
+            "ALTER TABLE conversions_new RENAME TO conversions",
+        ):
+            conn.execute(statement)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return True
+
 
 def insert_job(
     job_id: str,
@@ -135,40 +588,43 @@ def insert_job(
     file_type: Optional[str] = None,
     file_size: Optional[int] = None,
 ) -> None:
-    """Insert a new job record with PENDING status."""
-    with get_db() as conn:
+    """
+    Insert a new job record with PENDING status.
+
+    Written synchronously, unlike the updates: the row must exist before the job's
+    task is dispatched (the worker's updates are applied in another process), and a
+    get_job right after insert_job must find it.
+    """
+    conn = _get_conn()
+    with _write_lock, conn:
         conn.execute(
-            """
-            INSERT INTO conversions (job_id, user_id, filename, file_type, file_size, status)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """,
+            SQL_INSERT_JOB,
             (job_id, user_id, filename, file_type, file_size, Status.PENDING.value)
         )
-        logger.debug(f"Inserted job {job_id} for user {user_id}")
+    logger.debug(f"Inserted job {job_id} for user {user_id}")
 
 
 def update_job_status(job_id: str, status: str) -> None:
     """Update job status."""
-    with get_db() as conn:
-        conn.execute(
-            "UPDATE conversions SET status = ? WHERE job_id = ?",
-            (status, job_id)
-        )
-        logger.debug(f"Updated job {job_id} status to {status}")
+    _enqueue_write(SQL_UPDATE_STATUS, (status, job_id))
+    logger.debug(f"Updated job {job_id} status to {status}")
 
 
 def update_job_started(job_id: str) -> None:
     """Mark job as started (IN_PROGRESS)."""
-    with get_db() as conn:
-        conn.execute(
-            """
-            UPDATE conversions
-            SET status = ?, started_at = ?
-            WHERE job_id = ?
-            """,
-            (Status.IN_PROGRESS.value, datetime.utcnow().isoformat(), job_id)
-        )
-        logger.debug(f"Job {job_id} started")
+    _enqueue_write(
+        SQL_UPDATE_STARTED,
+        (Status.IN_PROGRESS.value, job_id)
+    )
+    logger.debug(f"Job {job_id} started")
+
+
+def update_batch_started(job_id: str) -> None:
+    """Mark a batch job as started (IN_PROGRESS) unless one of its documents already did."""
+    _enqueue_write(
+        SQL_UPDATE_BATCH_STARTED,
+        (Status.IN_PROGRESS.value, job_id, Status.PENDING.value)
+    )
 
 
 def update_job_complete(
@@ -186,37 +642,174 @@ def update_job_complete(
     """Update job with completion data."""
     tags_json = json.dumps(tags) if tags else None
 
-    with get_db() as conn:
-        conn.execute(
-            """
-            UPDATE conversions SET
-                status = ?,
-                completed_at = ?,
-                pages = ?,
-                processing_time_ms = ?,
-                result_url = ?,
-                error = ?,
-                summary = ?,
-                category = ?,
-                tags = ?,
-                language = ?
-            WHERE job_id = ?
-            """,
-            (
-                status,
-                datetime.utcnow().isoformat(),
-                pages,
-                processing_time_ms,
-                result_url,
-                error,
-                summary,
-                category,
-                tags_json,
-                language,
-                job_id
-            )
+    _enqueue_write(
+        SQL_UPDATE_COMPLETE,
+        (
+            status,
+            pages,
+            processing_time_ms,
+            result_url,
+            error,
+            summary,
+            category,
+            tags_json,
+            language,
+            job_id
         )
-        logger.debug(f"Job {job_id} completed with status {status}")
+    )
+    logger.debug(f"Job {job_id} completed with status {status}")
+
+
+def update_job_analysis(
+    job_id: str,
+    summary: Optional[str] = None,
+    category: Optional[str] = None,
+    tags: Optional[List[str]] = None,
+    language: Optional[str] = None,
+) -> None:
+    """Store LLM postprocessing results of a job."""
+    tags_json = json.dumps(tags) if tags else None
+
+    _enqueue_write(SQL_UPDATE_ANALYSIS, (summary, category, tags_json, language, job_id))
+    logger.debug(f"Job {job_id} analysis stored")
+
+
+def flush_audit() -> None:
+    """
+    Synchronously write all queued audit events.
+
+    Call before process shutdown, or when a following read must see
+    previously submitted writes.
+    """
+    with _write_lock:
+        batch = _take_queued_writes()
+        if batch:
+            _write_batch(batch)
+
+
+def close_db() -> None:
+    """
+    Write queued audit events and close this process's connections.
+
+    Audit calls made afterwards open new connections (an in-memory database is
+    discarded with its connection). For processes that exit without running
+    atexit handlers (Celery prefork children leave through os._exit) - call it
+    from their shutdown hook.
+    """
+    _stop_flusher()
+    flush_audit()
+    _close_connections()
+
+
+def _enqueue_write(sql: str, params: tuple) -> None:
+    """Queue a write statement for the background flusher."""
+    _ensure_flusher()
+    with _write_queue_cond:
+        if len(_write_queue) >= _MAX_QUEUED_WRITES:
+            logger.error(f"Audit write queue full ({_MAX_QUEUED_WRITES} writes), dropping write")
+            return
+        _write_queue.append((sql, params))
+        _write_queue_cond.notify()
+
+
+def _ensure_flusher() -> None:
+    """Start the background flusher thread if it is not running in this process."""
+    global _flusher_thread
+
+    if _flusher_thread is not None and _flusher_thread.is_alive():
+        return
+
+    with _write_queue_cond:
+        if _flusher_thread is None or not _flusher_thread.is_alive():
+            _flusher_thread = threading.Thread(
+                target=_flusher_loop, name="audit-flusher", daemon=True
+            )
+            _flusher_thread.start()
+
+
+def _stop_flusher() -> None:
+    """Stop the flusher thread - it writes what is queued and closes its own connection first."""
+    global _flusher_stopping
+    thread = _flusher_thread
+    if thread is None or not thread.is_alive():
+        return
+    with _write_queue_cond:
+        _flusher_stopping = True
+        _write_queue_cond.notify_all()
+    thread.join(timeout=10)
+    with _write_queue_cond:
+        _flusher_stopping = False
+
+
+def _flusher_loop() -> None:
+    """Commit queued writes in batches until close_db stops it."""
+    while True:
+        with _write_queue_cond:
+            while not _write_queue and not _flusher_stopping:
+                _write_queue_cond.wait()
+
+            # Let the rest of a burst accumulate so it shares one transaction
+            _write_queue_cond.wait_for(
+                lambda: len(_write_queue) >= _FLUSH_MAX_ROWS or _flusher_stopping, timeout=_FLUSH_INTERVAL
+            )
+            stopping = _flusher_stopping
+
+        try:
+            flush_audit()
+        except Exception as e:
+            logger.error(f"Audit flush failed: {e}")
+
+        if stopping:
+            _close_thread_connections()
+            return
+
+
+def _take_queued_writes() -> List[Tuple[str, tuple]]:
+    """Remove and return all queued writes in submission order."""
+    with _write_queue_cond:
+        batch = list(_write_queue)
+        _write_queue.clear()
+    return batch
+
+
+def _write_batch(batch: List[Tuple[str, tuple]]) -> None:
+    """
+    Write a batch of statements in a single transaction.
+
+    Consecutive runs of the same statement are sent with executemany. Runs are
+    never reordered, so writes for the same job_id are applied in submission order.
+    """
+    conn = _get_conn()
+    try:
+        with conn:
+            for sql, group in itertools.groupby(batch, key=lambda item: item[0]):
+                conn.executemany(sql, [params for _, params in group])
+        logger.debug(f"Flushed {len(batch)} audit writes")
+        return
+    except sqlite3.Error as e:
+        logger.warning(f"Batched audit write failed, retrying statements individually: {e}")
+
+    # One bad row (e.g. a duplicate job_id) must not drop the rest of the batch
+    for sql, params in batch:
+        try:
+            with conn:
+                conn.execute(sql, params)
+        except sqlite3.Error as e:
+            logger.error(f"Audit write failed: {e}")
+
+
+def _reset_after_fork() -> None:
+    """Give forked children their own queue and locks - the flusher thread is not inherited."""
+    global _write_queue, _write_queue_cond, _write_lock, _flusher_thread, _flusher_stopping
+    _write_queue = deque()
+    _write_queue_cond = threading.Condition()
+    _write_lock = threading.Lock()
+    _flusher_thread = None
+    _flusher_stopping = False
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+atexit.register(close_db)
 
 
 def get_job(job_id: str, user_id: Optional[str] = None) -> Optional[JobStatus]:
@@ -226,17 +819,12 @@ def get_job(job_id: str, user_id: Optional[str] = None) -> Optional[JobStatus]:
     If user_id is provided, only returns the job if it belongs to that user.
     Returns None if job not found or doesn't belong to user.
     """
-    with get_db() as conn:
+    conn = _get_ro_conn()
+    with conn:
         if user_id:
-            row = conn.execute(
-                "SELECT * FROM conversions WHERE job_id = ? AND user_id = ?",
-                (job_id, user_id)
-            ).fetchone()
+            row = conn.execute(SQL_GET_JOB_FOR_USER, (job_id, user_id)).fetchone()
         else:
-            row = conn.execute(
-                "SELECT * FROM conversions WHERE job_id = ?",
-                (job_id,)
-            ).fetchone()
+            row = conn.execute(SQL_GET_JOB, (job_id,)).fetchone()
 
         if not row:
             return None
@@ -246,192 +834,203 @@ def get_job(job_id: str, user_id: Optional[str] = None) -> Optional[JobStatus]:
 
 def get_active_jobs(user_id: str) -> List[JobStatus]:
     """Get all active (PENDING or IN_PROGRESS) jobs for a user."""
-    with get_db() as conn:
-        rows = conn.execute(
-            """
-            SELECT * FROM conversions
-            WHERE user_id = ? AND status IN (?, ?)
-            ORDER BY created_at ASC
-            """,
-            (user_id, Status.PENDING.value, Status.IN_PROGRESS.value)
-        ).fetchall()
+    conn = _get_ro_conn()
+    with conn:
+        rows = conn.execute(SQL_GET_ACTIVE_JOBS, (user_id,))
 
         return [_row_to_job_status(row) for row in rows]
 
 
 def get_user_history(user_id: str, days: int = 30) -> List[JobStatus]:
     """Get completed jobs (SUCCESS or FAILURE) for a user within specified days."""
-    with get_db() as conn:
+    conn = _get_ro_conn()
+    with conn:
         rows = conn.execute(
-            """
-            SELECT * FROM conversions
-            WHERE user_id = ?
-              AND status IN (?, ?)
-              AND created_at >= datetime('now', '-' || ? || ' days')
-            ORDER BY created_at DESC
-            """,
-            (user_id, Status.SUCCESS.value, Status.FAILURE.value, days)
-        ).fetchall()
+            SQL_GET_USER_HISTORY,
+            (
+                user_id,
+                Status.SUCCESS.value,
+                Status.FAILURE.value,
+                days,
+                None,
+                None,
+                None,
+                -1,  # No limit
+            )
+        )
 
         return [_row_to_job_status(row) for row in rows]
 
 
+def get_user_history_page(
+    user_id: str,
+    days: int = 30,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+) -> Tuple[List[JobStatus], Optional[str]]:
+    """
+    Get one page of completed jobs (SUCCESS or FAILURE) for a user within specified days.
+
+    Results are paginated newest first. Pass the returned cursor back to get
+    the next page; it is None when there are no more results.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    after_created_at, after_job_id = _decode_cursor(cursor) if cursor else (None, None)
+
+    conn = _get_ro_conn()
+    with conn:
+        rows = conn.execute(
+            SQL_GET_USER_HISTORY,
+            (
+                user_id,
+                Status.SUCCESS.value,
+                Status.FAILURE.value,
+                days,
+                after_created_at,
+                after_created_at,
+                after_job_id,
+                limit + 1,  # One extra row tells us whether another page exists
+            )
+        )
+
+        jobs = []
+        next_cursor = None
+        for row in rows:
+            if len(jobs) == limit:
+                next_cursor = _encode_cursor(jobs[-1].created_at, jobs[-1].job_id)
+                break
+            jobs.append(_row_to_job_status(row))
+
+        return jobs, next_cursor
+
+
+def _encode_cursor(created_at: str, job_id: str) -> str:
+    """Serialize a keyset pagination position."""
+    return base64.urlsafe_b64encode(f"{created_at}|{job_id}".encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Parse a cursor produced by _encode_cursor."""
+    try:
+        created_at, job_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 1)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    return created_at, job_id
+
+
 def search_user_history(user_id: str, query: str) -> List[JobStatus]:
-    """Search user's completed jobs by filename, summary, or tags."""
-    search_pattern = f"%{query}%"
+    """
+    Search user's completed jobs by filename, summary, or tags.
 
-    with get_db() as conn:
+    Each whitespace-separated term of the query is matched as a word prefix
+    (case and diacritics insensitive); all terms must match.
+    """
+    match_query = _fts_query(query)
+    if match_query is None:
+        return []
+
+    conn = _get_ro_conn()
+    with conn:
         rows = conn.execute(
-            """
-            SELECT * FROM conversions
-            WHERE user_id = ?
-              AND status IN (?, ?)
-              AND (
-                  filename LIKE ?
-                  OR summary LIKE ?
-                  OR tags LIKE ?
-              )
-            ORDER BY created_at DESC
-            """,
+            SQL_SEARCH_USER_HISTORY,
             (
+                match_query,
                 user_id,
                 Status.SUCCESS.value,
                 Status.FAILURE.value,
-                search_pattern,
-                search_pattern,
-                search_pattern
             )
-        ).fetchall()
+        )
 
         return [_row_to_job_status(row) for row in rows]
 
 
+def _fts_query(query: str) -> Optional[str]:
+    """Build an FTS5 MATCH expression from free text, quoting every term."""
+    terms = ['"' + term.replace('"', '""') + '"*' for term in query.split()]
+    return " ".join(terms) if terms else None
+
+
 def get_user_stats(user_id: str) -> Dict[str, Any]:
     """Get aggregated statistics for a user."""
-    with get_db() as conn:
-        # Basic stats
-        basic = conn.execute(
-            """
-            SELECT
-                COUNT(*) as total_jobs,
-                SUM(pages) as total_pages,
-                SUM(file_size) as total_files_size,
-                SUM(processing_time_ms) as total_processing_time_ms,
-                SUM(CASE WHEN status = ? THEN 1 ELSE 0 END) as success_count,
-                SUM(CASE WHEN status = ? THEN 1 ELSE 0 END) as failure_count
-            FROM conversions
-            WHERE user_id = ?
-            """,
+    conn = _get_ro_conn()
+    with conn:
+        rows = conn.execute(
+            SQL_USER_STATS,
             (Status.SUCCESS.value, Status.FAILURE.value, user_id)
-        ).fetchone()
-
-        # By file type
-        by_file_type = conn.execute(
-            """
-            SELECT file_type, COUNT(*) as count
-            FROM conversions
-            WHERE user_id = ? AND file_type IS NOT NULL
-            GROUP BY file_type
-            """,
-            (user_id,)
-        ).fetchall()
+        )
 
-        return {
-            "total_jobs": basic["total_jobs"] or 0,
-            "total_pages": basic["total_pages"] or 0,
-            "total_files_size": basic["total_files_size"] or 0,
-            "total_processing_time_ms": basic["total_processing_time_ms"] or 0,
-            "success_count": basic["success_count"] or 0,
-            "failure_count": basic["failure_count"] or 0,
-            "by_file_type": {row["file_type"]: row["count"] for row in by_file_type}
+        stats = {
+            "total_jobs": 0,
+            "total_pages": 0,
+            "total_files_size": 0,
+            "total_processing_time_ms": 0,
+            "success_count": 0,
+            "failure_count": 0,
+            "by_file_type": {}
         }
+        for row in rows:
+            stats["total_jobs"] += row["count"]
+            stats["total_pages"] += row["total_pages"] or 0
+            stats["total_files_size"] += row["total_files_size"] or 0
+            stats["total_processing_time_ms"] += row["total_processing_time_ms"] or 0
+            stats["success_count"] += row["success_count"]
+            stats["failure_count"] += row["failure_count"]
+            if row["file_type"] is not None:
+                stats["by_file_type"][row["file_type"]] = row["count"]
+
+        return stats
 
 
 def get_queue_stats() -> Dict[str, Any]:
     """Get queue statistics (admin only)."""
-    with get_db() as conn:
-        # Counts
-        counts = conn.execute(
-            """
-            SELECT
-                SUM(CASE WHEN status = ? THEN 1 ELSE 0 END) as pending_count,
-                SUM(CASE WHEN status = ? THEN 1 ELSE 0 END) as in_progress_count
-            FROM conversions
-            WHERE status IN (?, ?)
-            """,
-            (
-                Status.PENDING.value,
-                Status.IN_PROGRESS.value,
-                Status.PENDING.value,
-                Status.IN_PROGRESS.value
-            )
-        ).fetchone()
-
-        # Oldest pending
-        oldest = conn.execute(
-            """
-            SELECT MIN(created_at) as oldest_pending
-            FROM conversions
-            WHERE status = ?
-            """,
-            (Status.PENDING.value,)
-        ).fetchone()
+    conn = _get_ro_conn()
+    with conn:
+        stats = conn.execute(SQL_QUEUE_STATS).fetchone()
 
         # Calculate oldest pending minutes
         oldest_pending_minutes = None
-        if oldest["oldest_pending"]:
-            oldest_dt = datetime.fromisoformat(oldest["oldest_pending"])
+        if stats["oldest_pending"]:
+            oldest_dt = datetime.fromisoformat(stats["oldest_pending"])
             oldest_pending_minutes = int((datetime.utcnow() - oldest_dt).total_seconds() / 60)
 
-        # Average wait time (last hour)
-        avg_wait = conn.execute(
-            """
-            SELECT AVG(
-                (julianday(completed_at) - julianday(created_at)) * 24 * 60
-            ) as avg_wait_minutes
-            FROM conversions
-            WHERE status = ?
-              AND completed_at >= datetime('now', '-1 hour')
-            """,
-            (Status.SUCCESS.value,)
-        ).fetchone()
-
-        pending = counts["pending_count"] or 0
-        in_progress = counts["in_progress_count"] or 0
+        pending = stats["pending_count"] or 0
+        in_progress = stats["in_progress_count"] or 0
 
         return {
             "pending_count": pending,
             "in_progress_count": in_progress,
             "total_active": pending + in_progress,
             "oldest_pending_minutes": oldest_pending_minutes,
-            "avg_wait_time_minutes": round(avg_wait["avg_wait_minutes"] or 0, 2)
+            "avg_wait_time_minutes": round(stats["avg_wait_minutes"] or 0, 2)
         }
 
 
 def get_all_active_jobs() -> List[JobStatus]:
     """Get all active jobs (admin only)."""
-    with get_db() as conn:
-        rows = conn.execute(
-            """
-            SELECT * FROM conversions
-            WHERE status IN (?, ?)
-            ORDER BY created_at ASC
-            """,
-            (Status.PENDING.value, Status.IN_PROGRESS.value)
-        ).fetchall()
+    conn = _get_ro_conn()
+    with conn:
+        rows = conn.execute(SQL_GET_ALL_ACTIVE_JOBS)
 
         return [_row_to_job_status(row, include_user_id=True) for row in rows]
 
 
+def _convert_json(value: bytes) -> Any:
+    """sqlite3 converter for "[JSON]" columns - invalid JSON decodes to an empty list."""
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        return []
+
+
+sqlite3.register_converter("JSON", _convert_json)
+
+
 def _row_to_job_status(row: sqlite3.Row, include_user_id: bool = False) -> JobStatus:
     """Convert database row to JobStatus object."""
-    tags = None
-    if row["tags"]:
-        try:
-            tags = json.loads(row["tags"])
-        except json.JSONDecodeError:
-            tags = []
-
     return JobStatus(
         job_id=row["job_id"],
         status=row["status"],
@@ -447,6 +1046,6 @@ def _row_to_job_status(row: sqlite3.Row, include_user_id: bool = False) -> JobSt
         user_id=row["user_id"] if include_user_id else None,
         summary=row["summary"],
         category=row["category"],
-        tags=tags,
+        tags=row["tags"],
         language=row["language"],
     )
@@ -21,7 +21,7 @@ class ErrorCode(str, Enum):
     INTERNAL_ERROR = "INTERNAL_ERROR"
 
 
-@dataclass
+@dataclass(slots=True)
 class MCPError:
     """
     Standardized error response for MCP tools.
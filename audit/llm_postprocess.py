@@ -12,7 +12,8 @@ import json
 import logging
 import os
 from dataclasses import dataclass
-from typing import List, Optional
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 
 import litellm
 
@@ -25,8 +26,18 @@ logger = logging.getLogger(__name__)
 DEFAULT_MODEL = "claude-haiku-4-5-20251001"
 LLM_MODEL = os.getenv("MDCONVERT_LLM_MODEL", DEFAULT_MODEL)
 
-# Maximum characters to send to LLM (to control costs)
-MAX_CONTENT_LENGTH = 10000
+# Identifies the prompt, tool schema and model behind an analysis (part of the LLM cache key) -
+# bump the number whenever ANALYSIS_PROMPT or ANALYSIS_TOOL changes
+PROMPT_VERSION = f"1:{LLM_MODEL}"
+
+# Maximum tokens of document content to send to LLM (to control costs)
+MAX_CONTENT_TOKENS = 4000
+
+# Tokenizer used to measure content - cl100k_base is a close enough proxy for Claude
+TOKENIZER_ENCODING = "cl100k_base"
+
+# Characters per token assumed when tiktoken is not installed
+CHARS_PER_TOKEN = 4
 
 
 @dataclass
@@ -38,7 +49,7 @@ class AnalysisResult:
     language: str
 
 
-ANALYSIS_PROMPT = """Analyzuj následující dokument a vrať JSON s těmito poli:
+ANALYSIS_PROMPT = """Analyzuj následující dokument a výsledek předej nástroji emit_analysis s těmito poli:
 
 1. "summary": Stručný popis dokumentu v 1-2 větách (max 200 znaků). Použij jazyk dokumentu.
 2. "category": Kategorie dokumentu. Vyber jednu z:
@@ -53,13 +64,126 @@ ANALYSIS_PROMPT = """Analyzuj následující dokument a vrať JSON s těmito pol
 3. "tags": Pole 3-5 klíčových slov pro vyhledávání (v jazyce dokumentu)
 4. "language": Kód jazyka dokumentu (cs, en, de, sk, pl, ...)
 
-Odpověz POUZE validním JSON objektem, bez dalšího textu.
-
-Dokument:
+Dokument je obsahem zprávy uživatele.
 """
 
+CATEGORIES = [
+    "report",
+    "contract",
+    "invoice",
+    "presentation",
+    "manual",
+    "correspondence",
+    "form",
+    "other",
+]
+
+# Tool the model is forced to call - the schema constrains the output instead of prompt wording
+ANALYSIS_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "emit_analysis",
+        "description": "Uloží výsledek analýzy dokumentu.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "summary": {"type": "string", "maxLength": 200},
+                "category": {"type": "string", "enum": CATEGORIES},
+                "tags": {"type": "array", "maxItems": 5, "items": {"type": "string"}},
+                "language": {"type": "string"},
+            },
+            "required": ["summary", "category", "tags", "language"],
+        },
+    },
+}
+
+ANALYSIS_TOOL_CHOICE = {"type": "function", "function": {"name": "emit_analysis"}}
+
+TRUNCATED_NOTE = "Dokument byl zkrácen, analyzuj pouze jeho začátek."
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """Load the tokenizer once per process; None when tiktoken is not installed."""
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken is not installed, truncating document content by character count")
+        return None
+    return tiktoken.get_encoding(TOKENIZER_ENCODING)
+
 
-def analyze_document(markdown_content: str) -> Optional[AnalysisResult]:
+def _truncate_to_tokens(text: str, max_tokens: int) -> Tuple[str, bool]:
+    """
+    Truncate text to at most max_tokens tokens.
+
+    Returns:
+        Tuple of (possibly truncated text, whether it was truncated)
+    """
+    # Tokens average ~4 characters; tokenizing a bounded prefix avoids encoding huge documents
+    prefix = text[:max_tokens * 8]
+    encoding = _get_encoding()
+    if encoding is None:
+        limit = max_tokens * CHARS_PER_TOKEN
+        return text[:limit], len(text) > limit
+
+    tokens = encoding.encode(prefix, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return prefix, len(prefix) < len(text)
+
+    # A token boundary can fall inside a multi-byte character - drop the partial glyph
+    return encoding.decode(tokens[:max_tokens]).rstrip("\ufffd"), True
+
+
+def _build_request(markdown_content: str) -> Optional[Dict[str, Any]]:
+    """litellm completion arguments for analyzing a document, or None if it has no content."""
+    if not markdown_content or not markdown_content.strip():
+        logger.warning("Empty content, skipping LLM analysis")
+        return None
+
+    # Truncate content to control costs
+    content, truncated = _truncate_to_tokens(markdown_content, MAX_CONTENT_TOKENS)
+
+    # Static instructions in the system message, the document alone in the user message.
+    # No prompt-cache breakpoint - the prompt is far below the provider's minimum cacheable size.
+    system_content = ANALYSIS_PROMPT + TRUNCATED_NOTE if truncated else ANALYSIS_PROMPT
+
+    return dict(
+        model=LLM_MODEL,
+        messages=[
+            {
+                "role": "system",
+                "content": system_content,
+            },
+            {
+                "role": "user",
+                "content": content
+            }
+        ],
+        tools=[ANALYSIS_TOOL],
+        tool_choice=ANALYSIS_TOOL_CHOICE,
+        max_tokens=500,
+        temperature=0.3,  # Lower temperature for consistent output
+    )
+
+
+def _parse_response(response) -> AnalysisResult:
+    """AnalysisResult from the structured arguments of the forced emit_analysis call."""
+    arguments = response.choices[0].message.tool_calls[0].function.arguments
+    data = json.loads(arguments)
+
+    result = AnalysisResult(
+        summary=data.get("summary", "")[:200],  # Ensure max length
+        category=data.get("category", "other"),
+        tags=data.get("tags", [])[:5],  # Ensure max 5 tags
+        language=data.get("language", "cs"),
+    )
+
+    logger.info(f"LLM analysis complete: category={result.category}, language={result.language}")
+    return result
+
+
+async def analyze_document(markdown_content: str) -> Optional[AnalysisResult]:
     """
     Analyze document content using LLM.
 
@@ -70,57 +194,14 @@ def analyze_document(markdown_content: str) -> Optional[AnalysisResult]:
         AnalysisResult with summary, category, tags, language
         or None if analysis fails
     """
-    if not markdown_content or not markdown_content.strip():
-        logger.warning("Empty content, skipping LLM analysis")
+    request = _build_request(markdown_content)
+    if request is None:
         return None
 
-    # Truncate content to control costs
-    content = markdown_content[:MAX_CONTENT_LENGTH]
-    if len(markdown_content) > MAX_CONTENT_LENGTH:
-        content += "\n\n[... obsah zkrácen ...]"
-
     try:
         logger.info(f"Running LLM postprocessing with model: {LLM_MODEL}")
-
-        response = litellm.completion(
-            model=LLM_MODEL,
-            messages=[
-                {
-                    "role": "user",
-                    "content": ANALYSIS_PROMPT + content
-                }
-            ],
-            max_tokens=500,
-            temperature=0.3,  # Lower temperature for consistent output
-        )
-
-        # Extract response text
-        response_text = response.choices[0].message.content.strip()
-
-        # Parse JSON response
-        try:
-            # Handle potential markdown code blocks
-            if response_text.startswith("```"):
-                response_text = response_text.split("```")[1]
-                if response_text.startswith("json"):
-                    response_text = response_text[4:]
-
-            data = json.loads(response_text)
-
-            result = AnalysisResult(
-                summary=data.get("summary", "")[:200],  # Ensure max length
-                category=data.get("category", "other"),
-                tags=data.get("tags", [])[:5],  # Ensure max 5 tags
-                language=data.get("language", "cs"),
-            )
-
-            logger.info(f"LLM analysis complete: category={result.category}, language={result.language}")
-            return result
-
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse LLM response as JSON: {e}")
-            logger.debug(f"Response was: {response_text[:500]}")
-            return None
+        response = await litellm.acompletion(**request)
+        return _parse_response(response)
 
     except Exception as e:
         logger.error(f"LLM postprocessing failed: {e}")
@@ -129,8 +210,20 @@ def analyze_document(markdown_content: str) -> Optional[AnalysisResult]:
 
 def analyze_document_sync(markdown_content: str) -> Optional[AnalysisResult]:
     """
-    Synchronous wrapper for analyze_document.
+    Synchronous version of analyze_document.
 
-    For use in Celery workers which may not support async.
+    For use in Celery workers - makes a blocking litellm.completion call, so no
+    event loop is created and torn down per document.
     """
-    return analyze_document(markdown_content)
+    request = _build_request(markdown_content)
+    if request is None:
+        return None
+
+    try:
+        logger.info(f"Running LLM postprocessing with model: {LLM_MODEL}")
+        response = litellm.completion(**request)
+        return _parse_response(response)
+
+    except Exception as e:
+        logger.error(f"LLM postprocessing failed: {e}")
+        return None
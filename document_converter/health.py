@@ -1,13 +1,54 @@
 """Health check endpoints for monitoring and readiness probes."""
 
+import asyncio
 import logging
-from typing import Dict, Any
+import threading
+import time
+from typing import Dict, Any, Optional
 from fastapi import APIRouter, Response, status
 
 router = APIRouter()
 
 logger = logging.getLogger(__name__)
 
+# Celery inspect broadcasts to every worker, so probes share one snapshot per TTL
+CELERY_SNAPSHOT_TTL = 2.0
+CELERY_INSPECT_TIMEOUT = 0.5
+
+_celery_snapshot_cache: Optional[Dict[str, Any]] = None
+_celery_snapshot_expires = 0.0
+_celery_snapshot_lock = threading.Lock()
+
+
+def _celery_snapshot() -> Dict[str, Any]:
+    """
+    Get worker stats and active tasks, memoized for CELERY_SNAPSHOT_TTL seconds.
+
+    Returns a dict with "stats" and "active", or "error" if the inspect call failed.
+    Failures are cached too, so an unreachable broker isn't hammered by every probe.
+
+    This blocks on a Kombu RPC - call it via asyncio.to_thread from async endpoints.
+    Concurrent callers wait on the lock and reuse the refreshed snapshot, so at
+    most one thread is inspecting at a time.
+    """
+    global _celery_snapshot_cache, _celery_snapshot_expires
+
+    with _celery_snapshot_lock:
+        if _celery_snapshot_cache is not None and time.monotonic() < _celery_snapshot_expires:
+            return _celery_snapshot_cache
+
+        try:
+            from worker.celery_config import celery_app
+
+            inspect = celery_app.control.inspect(timeout=CELERY_INSPECT_TIMEOUT)
+            snapshot = {"stats": inspect.stats(), "active": inspect.active()}
+        except Exception as e:
+            snapshot = {"error": str(e)}
+
+        _celery_snapshot_cache = snapshot
+        _celery_snapshot_expires = time.monotonic() + CELERY_SNAPSHOT_TTL
+        return snapshot
+
 
 @router.get(
     "/health",
@@ -47,11 +88,11 @@ async def readiness_check(response: Response) -> Dict[str, Any]:
 
     # Check Redis/Celery
     try:
-        from worker.celery_config import celery_app
-
         # Ping Celery - check if workers are available (with timeout)
-        inspect = celery_app.control.inspect(timeout=1.0)
-        stats = inspect.stats()
+        snapshot = await asyncio.to_thread(_celery_snapshot)
+        if "error" in snapshot:
+            raise RuntimeError(snapshot["error"])
+        stats = snapshot["stats"]
 
         if stats:
             checks["checks"]["celery_workers"] = {
@@ -113,11 +154,11 @@ async def metrics() -> Dict[str, Any]:
 
     # Try to get Celery metrics
     try:
-        from worker.celery_config import celery_app
-
-        inspect = celery_app.control.inspect(timeout=1.0)
-        stats = inspect.stats()
-        active = inspect.active()
+        snapshot = await asyncio.to_thread(_celery_snapshot)
+        if "error" in snapshot:
+            raise RuntimeError(snapshot["error"])
+        stats = snapshot["stats"]
+        active = snapshot["active"]
 
         if stats:
             metrics_data["celery"] = {
@@ -0,0 +1,48 @@
+"""
+MarkItDown conversion of Office documents (DOCX, XLSX, PPTX).
+
+Kept apart from the service module, which imports Docling, Celery and FastAPI: the
+batch office pool spawns fresh interpreters, and its workers import only this module.
+"""
+
+import logging
+import threading
+from io import BytesIO
+from pathlib import Path
+from typing import BinaryIO, Optional, Tuple
+
+from markitdown import MarkItDown, StreamInfo
+
+_markitdown: Optional[MarkItDown] = None
+_markitdown_lock = threading.Lock()
+
+
+def get_markitdown() -> MarkItDown:
+    """MarkItDown instance shared by the whole process, built on first use.
+
+    Construction registers all of its converters; conversions keep no state on the
+    instance, so concurrent calls can share it.
+    """
+    global _markitdown
+    with _markitdown_lock:
+        if _markitdown is None:
+            _markitdown = MarkItDown()
+    return _markitdown
+
+
+def convert_to_markdown(filename: str, file: BinaryIO) -> str:
+    """Markdown of an Office document."""
+    # Pass the name via StreamInfo - uploaded spooled files have a read-only name
+    result = get_markitdown().convert_stream(
+        file, stream_info=StreamInfo(filename=filename, extension=Path(filename).suffix.lower())
+    )
+    return result.text_content
+
+
+def convert_office_document(filename: str, data: bytes) -> Tuple[Optional[str], Optional[str]]:
+    """Office pool entry point - (markdown, None) on success, (None, error) on failure."""
+    try:
+        return convert_to_markdown(filename, BytesIO(data)), None
+    except Exception as e:
+        logging.error(f"MarkItDown failed to convert {filename}: {str(e)}")
+        return None, str(e)
@@ -1,6 +1,15 @@
-from io import BytesIO
-from typing import List, Optional
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Iterable, List, Optional
+import redis.asyncio
+from celery import chord, states
+from celery.result import GroupResult
+from celery.utils import uuid
 from fastapi import APIRouter, File, HTTPException, UploadFile, Query, Header
+from starlette.concurrency import run_in_threadpool
 
 from document_converter.schema import (
     BatchConversionJobResult,
@@ -11,40 +20,53 @@ from document_converter.schema import (
     JobStatusEnum
 )
 from document_converter.service import DocumentConverterService, DoclingDocumentConversion
-from document_converter.utils import is_file_format_supported, is_legacy_office_format, guess_format
-from worker.tasks import convert_document_task, convert_documents_task
+from document_converter.utils import FormatInfo, detect_format
+from worker.tasks import collect_batch_results, convert_document_task, mark_batch_failed
 from worker.celery_config import celery_app
+from worker import payload_store
 
 # Import audit module for SQLite logging
 try:
-    from audit import insert_job, get_job, Status
+    from audit import insert_job, update_job_complete, get_job, Status
     AUDIT_ENABLED = True
 except ImportError:
     AUDIT_ENABLED = False
 
 router = APIRouter()
 
+# Leading bytes needed for format detection (filetype inspects at most 8 KB)
+SNIFF_BYTES = 8192
+
+# Threads for synchronous conversions, separate from the default threadpool, so conversions never
+# take all threads from status lookups and upload I/O. Kept low by default: each Docling conversion
+# starts its own torch/OpenMP threads, and every API process (uvicorn worker) has its own pool.
+CONVERSION_WORKERS = int(os.getenv("MDCONVERT_CONVERSION_WORKERS", "2"))
+_conversion_executor = ThreadPoolExecutor(max_workers=CONVERSION_WORKERS, thread_name_prefix="conversion")
+
 # Could be docling or another converter as long as it implements DocumentConversionBase
 converter = DoclingDocumentConversion()
 document_converter_service = DocumentConverterService(document_converter=converter)
 
 
-# Document direct conversion endpoints
-@router.post(
-    '/documents/convert',
-    response_model=ConversionResult,
-    response_model_exclude_unset=True,
-    description="Convert a single document synchronously",
-)
-async def convert_single_document(
-    document: UploadFile = File(...),
-    extract_tables_as_images: bool = False,
-    image_resolution_scale: int = Query(4, ge=1, le=4),
-):
-    file_bytes = await document.read()
+async def _run_conversion(func, *args, **kwargs):
+    """Run a blocking conversion on the conversion threads, keeping the event loop free."""
+    return await asyncio.get_running_loop().run_in_executor(_conversion_executor, partial(func, *args, **kwargs))
+
+
+async def _detect_upload_format(document: UploadFile) -> FormatInfo:
+    """
+    Detect the format of an upload from its leading bytes and rewind it.
+
+    Raises:
+        HTTPException: 400 if the format is a legacy Office format or not supported.
+    """
+    header = await document.read(SNIFF_BYTES)
+    await document.seek(0)
+
+    format_info = detect_format(header, document.filename)
 
     # Check for legacy Office formats and provide helpful error
-    if is_legacy_office_format(document.filename):
+    if format_info.legacy:
         raise HTTPException(
             status_code=400,
             detail=(
@@ -54,13 +76,34 @@ async def convert_single_document(
             )
         )
 
-    if not is_file_format_supported(file_bytes, document.filename):
+    if not format_info.supported:
         raise HTTPException(status_code=400, detail=f"Unsupported file format: {document.filename}")
 
-    return document_converter_service.convert_document(
-        (document.filename, BytesIO(file_bytes)),
+    return format_info
+
+
+# Document direct conversion endpoints
+@router.post(
+    '/documents/convert',
+    response_model=ConversionResult,
+    response_model_exclude_unset=True,
+    description="Convert a single document synchronously",
+)
+async def convert_single_document(
+    document: UploadFile = File(...),
+    extract_tables_as_images: bool = False,
+    image_resolution_scale: int = Query(4, ge=1, le=4),
+    picture_max_dim: Optional[int] = Query(None, ge=1, description="Downscale pictures to fit this size (px)"),
+):
+    await _detect_upload_format(document)
+
+    # Hand over the spooled upload itself instead of copying it into memory
+    return await _run_conversion(
+        document_converter_service.convert_document,
+        (document.filename, document.file),
         extract_tables=extract_tables_as_images,
         image_resolution_scale=image_resolution_scale,
+        picture_max_dim=picture_max_dim,
     )
 
 
@@ -74,30 +117,18 @@ async def convert_multiple_documents(
     documents: List[UploadFile] = File(...),
     extract_tables_as_images: bool = False,
     image_resolution_scale: int = Query(4, ge=1, le=4),
+    picture_max_dim: Optional[int] = Query(None, ge=1, description="Downscale pictures to fit this size (px)"),
 ):
-    doc_streams = []
-    for document in documents:
-        file_bytes = await document.read()
-
-        # Check for legacy Office formats and provide helpful error
-        if is_legacy_office_format(document.filename):
-            raise HTTPException(
-                status_code=400,
-                detail=(
-                    f"Legacy Office format not supported: {document.filename}. "
-                    f"Please convert to modern format (.docx, .xlsx, or .pptx) first. "
-                    f"Supported formats: DOCX, XLSX, PPTX, PDF, PNG, JPEG, TIFF"
-                )
-            )
-
-        if not is_file_format_supported(file_bytes, document.filename):
-            raise HTTPException(status_code=400, detail=f"Unsupported file format: {document.filename}")
-        doc_streams.append((document.filename, BytesIO(file_bytes)))
+    # Uploads are independent spooled files - reads of rolled-over ones overlap in the threadpool
+    await asyncio.gather(*(_detect_upload_format(document) for document in documents))
+    doc_streams = [(document.filename, document.file) for document in documents]
 
-    return document_converter_service.convert_documents(
+    return await _run_conversion(
+        document_converter_service.convert_documents,
         doc_streams,
         extract_tables=extract_tables_as_images,
         image_resolution_scale=image_resolution_scale,
+        picture_max_dim=picture_max_dim,
     )
 
 
@@ -111,54 +142,54 @@ async def create_single_document_conversion_job(
     document: UploadFile = File(...),
     extract_tables_as_images: bool = False,
     image_resolution_scale: int = Query(4, ge=1, le=4),
+    picture_max_dim: Optional[int] = Query(None, ge=1, description="Downscale pictures to fit this size (px)"),
     x_user_id: Optional[str] = Header(None, alias="X-User-ID"),
 ):
-    file_bytes = await document.read()
-
-    # Check for legacy Office formats and provide helpful error
-    if is_legacy_office_format(document.filename):
-        raise HTTPException(
-            status_code=400,
-            detail=(
-                f"Legacy Office format not supported: {document.filename}. "
-                f"Please convert to modern format (.docx, .xlsx, or .pptx) first. "
-                f"Supported formats: DOCX, XLSX, PPTX, PDF, PNG, JPEG, TIFF"
-            )
-        )
-
-    if not is_file_format_supported(file_bytes, document.filename):
-        raise HTTPException(status_code=400, detail=f"Unsupported file format: {document.filename}")
+    format_info = await _detect_upload_format(document)
 
     # Detect file type for audit
-    detected_format = guess_format(file_bytes, document.filename)
-    file_type = detected_format.value if detected_format else None
+    file_type = format_info.format.value if format_info.format else None
 
-    task = convert_document_task.delay(
-        (document.filename, file_bytes),
-        extract_tables=extract_tables_as_images,
-        image_resolution_scale=image_resolution_scale,
-        user_id=x_user_id,
-    )
+    # Hand the upload to the worker through the shared payload directory, not the broker
+    payload_key = await run_in_threadpool(payload_store.put, document.file)
+    job_id = uuid()
 
-    # Insert job into SQLite audit log
+    # Insert job into SQLite audit log - before dispatch, so the worker's updates always find the row
     if AUDIT_ENABLED and x_user_id:
         try:
-            insert_job(
-                job_id=task.id,
+            await run_in_threadpool(
+                insert_job,
+                job_id=job_id,
                 user_id=x_user_id,
                 filename=document.filename,
                 file_type=file_type,
-                file_size=len(file_bytes),
+                file_size=document.size,
             )
         except Exception:
             pass  # Don't fail the request if audit logging fails
 
+    try:
+        task = convert_document_task.apply_async(
+            ((document.filename, payload_key),),
+            dict(
+                extract_tables=extract_tables_as_images,
+                image_resolution_scale=image_resolution_scale,
+                picture_max_dim=picture_max_dim,
+                user_id=x_user_id,
+            ),
+            task_id=job_id,
+        )
+    except Exception as e:
+        payload_store.delete(payload_key)
+        _audit_dispatch_failed(job_id, x_user_id, e)
+        raise
+
     return ConversationJobResult(
         job_id=task.id,
         status=JobStatusEnum.PENDING,
         filename=document.filename,
         file_type=file_type,
-        file_size=len(file_bytes),
+        file_size=document.size,
     )
 
 
@@ -168,14 +199,75 @@ async def create_single_document_conversion_job(
     description="Get the status of a single document conversion job",
     response_model_exclude_unset=True,
 )
-async def get_conversion_job_status(
+def get_conversion_job_status(
     job_id: str,
     x_user_id: Optional[str] = Header(None, alias="X-User-ID"),
 ):
     # Get Celery task result
     celery_result = document_converter_service.get_single_document_task_result(job_id)
+    return _enrich_with_audit(celery_result, job_id, x_user_id)
+
+
+@router.get(
+    '/conversion-jobs/{job_id}/wait',
+    response_model=ConversationJobResult,
+    description="Wait for a single document conversion job to finish and return its status",
+    response_model_exclude_unset=True,
+)
+async def wait_for_conversion_job(
+    job_id: str,
+    timeout: float = Query(30, gt=0, le=300),
+    x_user_id: Optional[str] = Header(None, alias="X-User-ID"),
+):
+    """
+    Long-poll variant of the status endpoint.
+
+    Returns as soon as the worker stores the result, or the current status
+    (IN_PROGRESS) once the timeout expires. A waiting client holds no thread.
+    """
+    await _wait_until_ready(job_id, timeout)
+
+    celery_result = await asyncio.to_thread(document_converter_service.get_single_document_task_result, job_id)
+    return await asyncio.to_thread(_enrich_with_audit, celery_result, job_id, x_user_id)
+
+
+_result_redis: Optional[redis.asyncio.Redis] = None
+
+
+def _get_result_redis() -> redis.asyncio.Redis:
+    """Async client of the Redis result backend, created on first use (on the event loop)."""
+    global _result_redis
+    if _result_redis is None:
+        _result_redis = redis.asyncio.Redis.from_url(celery_app.conf.result_backend)
+    return _result_redis
+
 
-    # Enrich with SQLite data if available
+async def _wait_until_ready(job_id: str, timeout: float) -> None:
+    """
+    Return once a task's result is stored, or after timeout seconds.
+
+    The Redis result backend publishes every state it stores on the task's result key,
+    so this awaits a pub/sub message instead of polling the backend.
+    """
+    deadline = time.monotonic() + timeout
+    async with _get_result_redis().pubsub() as pubsub:
+        await pubsub.subscribe(celery_app.backend.get_key_for_task(job_id))
+        # Checked after subscribing, so a result stored in between is not missed
+        if await asyncio.to_thread(celery_app.AsyncResult(job_id).ready):
+            return
+
+        while (remaining := deadline - time.monotonic()) > 0:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+            if message and celery_app.backend.decode_result(message["data"])["status"] in states.READY_STATES:
+                return
+
+
+def _enrich_with_audit(
+    celery_result: ConversationJobResult,
+    job_id: str,
+    x_user_id: Optional[str],
+) -> ConversationJobResult:
+    """Merge job metadata from the SQLite audit log into a Celery job result."""
     if AUDIT_ENABLED:
         try:
             # Pass user_id for access control
@@ -207,23 +299,28 @@ async def get_conversion_job_status(
     response_model=BatchCancelResponse,
     description="Cancel multiple conversion jobs by their task IDs"
 )
-async def cancel_batch_conversion_jobs(request: BatchCancelRequest):
+def cancel_batch_conversion_jobs(request: BatchCancelRequest):
     """
     Cancel multiple Celery conversion tasks.
 
-    This will terminate the running tasks immediately.
+    This will terminate the running tasks immediately; cancelling a batch job also
+    cancels the conversions of its documents.
     Tasks that are already completed or failed will be ignored.
     """
     cancelled_tasks = []
 
-    for task_id in request.task_ids:
-        try:
-            # Revoke task with terminate=True to kill the worker process
-            celery_app.control.revoke(task_id, terminate=True, signal='SIGKILL')
-            cancelled_tasks.append(task_id)
-        except Exception as e:
-            # Log but continue with other tasks
-            print(f"Failed to cancel task {task_id}: {e}")
+    try:
+        task_ids = list(request.task_ids)
+        for task_id in request.task_ids:
+            batch = GroupResult.restore(task_id, app=celery_app)
+            if batch is not None:
+                task_ids.extend(result.id for result in batch.results)
+
+        # One broadcast for all ids - terminate=True kills the worker processes running them
+        celery_app.control.revoke(task_ids, terminate=True, signal='SIGKILL')
+        cancelled_tasks = list(request.task_ids)
+    except Exception as e:
+        print(f"Failed to cancel tasks {request.task_ids}: {e}")
 
     return BatchCancelResponse(
         cancelled_count=len(cancelled_tasks),
@@ -241,60 +338,96 @@ async def create_batch_conversion_job(
     documents: List[UploadFile] = File(...),
     extract_tables_as_images: bool = False,
     image_resolution_scale: int = Query(4, ge=1, le=4),
+    picture_max_dim: Optional[int] = Query(None, ge=1, description="Downscale pictures to fit this size (px)"),
     x_user_id: Optional[str] = Header(None, alias="X-User-ID"),
 ):
     """Create a batch conversion job for multiple documents."""
-    doc_data = []
-    total_size = 0
-    for document in documents:
-        file_bytes = await document.read()
-        total_size += len(file_bytes)
-
-        # Check for legacy Office formats and provide helpful error
-        if is_legacy_office_format(document.filename):
-            raise HTTPException(
-                status_code=400,
-                detail=(
-                    f"Legacy Office format not supported: {document.filename}. "
-                    f"Please convert to modern format (.docx, .xlsx, or .pptx) first. "
-                    f"Supported formats: DOCX, XLSX, PPTX, PDF, PNG, JPEG, TIFF"
-                )
-            )
-
-        if not is_file_format_supported(file_bytes, document.filename):
-            raise HTTPException(status_code=400, detail=f"Unsupported file format: {document.filename}")
-        doc_data.append((document.filename, file_bytes))
+    # Uploads are independent spooled files - reads of rolled-over ones overlap in the threadpool
+    await asyncio.gather(*(_detect_upload_format(document) for document in documents))
 
-    task = convert_documents_task.delay(
-        doc_data,
-        extract_tables=extract_tables_as_images,
-        image_resolution_scale=image_resolution_scale,
-        user_id=x_user_id,
+    # Every document becomes its own conversion task, handed over through the payload store, so
+    # free workers convert them in parallel; the batch job is the chord callback collecting them
+    payload_keys = await asyncio.gather(
+        *(run_in_threadpool(payload_store.put, document.file) for document in documents)
     )
+    filenames = [document.filename for document in documents]
+    total_size = sum(document.size or 0 for document in documents)
+    batch_id = uuid()
 
-    # Insert batch job into SQLite audit log
+    # Insert batch job into SQLite audit log - before dispatch, so the worker's updates always find the row
     if AUDIT_ENABLED and x_user_id:
         try:
-            filenames = ", ".join([d[0] for d in doc_data])
-            insert_job(
-                job_id=task.id,
+            await run_in_threadpool(
+                insert_job,
+                job_id=batch_id,
                 user_id=x_user_id,
-                filename=f"[BATCH: {len(doc_data)} files] {filenames[:100]}",
+                filename=f"[BATCH: {len(filenames)} files] {_join_truncated(filenames, 100)}",
                 file_type="batch",
                 file_size=total_size,
             )
         except Exception:
             pass  # Don't fail the request if audit logging fails
 
+    try:
+        task = chord(
+            convert_document_task.s(
+                (filename, payload_key),
+                extract_tables=extract_tables_as_images,
+                image_resolution_scale=image_resolution_scale,
+                picture_max_dim=picture_max_dim,
+                # The first document to start marks the audited batch job as started
+                batch_job_id=batch_id if x_user_id else None,
+            )
+            for filename, payload_key in zip(filenames, payload_keys)
+        )(
+            # Immutable - the documents' results stay in the result backend instead of
+            # travelling to the callback through the broker
+            collect_batch_results.si(submitted_at=time.time(), user_id=x_user_id).on_error(
+                mark_batch_failed.s(user_id=x_user_id)
+            ),
+            task_id=batch_id,
+        )
+        # The documents' tasks, saved under the batch job id - for the batch result and cancellation
+        celery_app.GroupResult(batch_id, task.parent.results).save()
+    except Exception as e:
+        for payload_key in payload_keys:
+            payload_store.delete(payload_key)
+        _audit_dispatch_failed(batch_id, x_user_id, e)
+        raise
+
     return BatchConversionJobResult(job_id=task.id, status=JobStatusEnum.PENDING)
 
 
+def _audit_dispatch_failed(job_id: str, x_user_id: Optional[str], exc: Exception) -> None:
+    """Record a job whose task could not be queued as failed, so its audit row does not stay PENDING."""
+    if AUDIT_ENABLED and x_user_id:
+        try:
+            update_job_complete(job_id=job_id, status=Status.FAILURE.value, error=f"Failed to queue the job: {exc}")
+        except Exception:
+            pass  # Don't fail the request if audit logging fails
+
+
+def _join_truncated(names: Iterable[str], limit: int) -> str:
+    """Equivalent to ", ".join(names)[:limit] without joining names past the limit."""
+    parts = []
+    length = 0
+    for name in names:
+        if length >= limit:
+            break
+        if parts:
+            parts.append(", ")
+            length += 2
+        parts.append(name)
+        length += len(name)
+    return "".join(parts)[:limit]
+
+
 @router.get(
     '/batch-conversion-jobs/{job_id}',
     response_model=BatchConversionJobResult,
     response_model_exclude_unset=True,
     description="Get the status of a batch conversion job",
 )
-async def get_batch_conversion_job_status(job_id: str):
+def get_batch_conversion_job_status(job_id: str):
     """Get the status and results of a batch conversion job."""
     return document_converter_service.get_batch_conversion_task_result(job_id)
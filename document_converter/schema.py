@@ -1,5 +1,14 @@
-from pydantic import BaseModel, Field
-from typing import List, Literal, Optional
+import base64
+
+from pydantic import BaseModel, Field, PlainSerializer
+from typing import Annotated, List, Literal, Optional
+
+
+# Raw bytes internally and across Celery (msgpack); standard base64 in JSON responses
+Base64Bytes = Annotated[
+    bytes,
+    PlainSerializer(lambda data: base64.b64encode(data).decode("ascii"), return_type=str, when_used="json"),
+]
 
 
 # Status constants - unified across API and MCP
@@ -13,7 +22,7 @@ class JobStatusEnum:
 class ImageData(BaseModel):
     type: Optional[Literal["table", "picture"]] = Field(None, description="The type of the image")
     filename: Optional[str] = Field(None, description="The filename of the image")
-    image: Optional[str] = Field(None, description="The image data")
+    image: Optional[Base64Bytes] = Field(None, description="The image data (base64-encoded in JSON)")
 
 
 class ConversionResult(BaseModel):
@@ -1,32 +1,158 @@
-import base64
+import itertools
 import logging
+import multiprocessing
+import os
+import threading
 from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
 from io import BytesIO
-from typing import List, Tuple
+from typing import BinaryIO, List, Optional, Tuple, Union
 
-from celery.result import AsyncResult
+from celery.result import AsyncResult, GroupResult
 from docling.datamodel.base_models import InputFormat, DocumentStream
-from docling.datamodel.pipeline_options import PdfPipelineOptions, EasyOcrOptions
+from docling.datamodel.pipeline_options import PdfPipelineOptions, EasyOcrOptions, RapidOcrOptions
 from docling.document_converter import PdfFormatOption, ImageFormatOption, DocumentConverter
-from docling_core.types.doc import ImageRefMode, TableItem, PictureItem
+from docling_core.transforms.serializer.markdown import (
+    MarkdownDocSerializer,
+    MarkdownParams,
+    MarkdownPictureSerializer,
+    MarkdownTableSerializer,
+)
+from docling_core.types.doc import ImageRefMode, PictureItem, SectionHeaderItem, TableItem
 from fastapi import HTTPException
 from hierarchical.postprocessor import ResultPostprocessor
-from markitdown import MarkItDown
+from PIL import Image, ImageOps
 
+from document_converter.office import convert_office_document, convert_to_markdown
 from document_converter.schema import BatchConversionJobResult, ConversationJobResult, ConversionResult, ImageData
-from document_converter.utils import handle_csv_file
+from document_converter.utils import LEGACY_OFFICE_EXTENSIONS, file_extension, handle_csv_file
 
 logging.basicConfig(level=logging.INFO)
 IMAGE_RESOLUTION_SCALE = 4
 
+# OCR engine for the default pipeline: "easyocr" (PyTorch, INT8 dynamic quantization on CPU)
+# or "rapidocr" (ONNX Runtime)
+OCR_ENGINE = os.getenv("MDCONVERT_OCR_ENGINE", "easyocr")
+
+# Worker processes for MarkItDown conversions in batches - each API and Celery worker process
+# starts its own pool, so it stays small
+OFFICE_POOL_WORKERS = int(os.getenv("MDCONVERT_OFFICE_POOL_WORKERS", "2"))
+
+# Converters kept per DoclingDocumentConversion - one per (extract_tables, image_resolution_scale)
+CONVERTER_CACHE_SIZE = 8
+
+# Extension sets used to route documents to a converter (lowercase, without the dot)
+OFFICE_EXTENSIONS = frozenset({'docx', 'xlsx', 'pptx'})
+MARKDOWN_EXTENSIONS = frozenset({'md', 'markdown'})
+# Formats with layout predictions and provenance data (needed for hierarchical postprocessing)
+LAYOUT_EXTENSIONS = frozenset({'pdf', 'png', 'jpg', 'jpeg', 'tif', 'tiff', 'bmp'})
+# Converter group per extension; anything not listed goes to Docling
+_EXTENSION_GROUPS = {
+    **{ext: "office" for ext in OFFICE_EXTENSIONS},
+    **{ext: "markdown" for ext in MARKDOWN_EXTENSIONS},
+}
+
+# Fast zlib level - images are re-encoded on every conversion, size matters less than CPU time
+PNG_COMPRESS_LEVEL = 1
+
+_IMAGE_ENCODER_POOL = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="image-encoder")
+
+
+# Format for extracted pictures: "webp" (much faster to encode and smaller than PNG) or "png".
+# Tables always stay PNG - lossless keeps the text in them crisp.
+PICTURE_FORMAT = "png" if os.getenv("MDCONVERT_PICTURE_FORMAT", "webp").lower() == "png" else "webp"
+WEBP_QUALITY = 85
+
+
+def _encode_png(pil_image) -> bytes:
+    # Raw bytes - base64 is only applied when a result is rendered as JSON
+    img_buffer = BytesIO()
+    pil_image.save(img_buffer, format="PNG", optimize=False, compress_level=PNG_COMPRESS_LEVEL)
+    return img_buffer.getvalue()
+
+
+def _encode_webp(pil_image) -> bytes:
+    img_buffer = BytesIO()
+    pil_image.save(img_buffer, format="WEBP", quality=WEBP_QUALITY, method=4)
+    return img_buffer.getvalue()
+
+
+def _encode_image(item: Tuple[str, object, Optional[int]]) -> bytes:
+    image_format, pil_image, max_dim = item
+    if max_dim and max(pil_image.size) > max_dim:
+        # New downscaled image - the document's own image is left untouched
+        pil_image = ImageOps.contain(pil_image, (max_dim, max_dim), Image.LANCZOS)
+    return _encode_webp(pil_image) if image_format == "webp" else _encode_png(pil_image)
+
+
+_office_pool: Optional[ProcessPoolExecutor] = None
+_office_pool_lock = threading.Lock()
+
+
+def _get_office_pool() -> ProcessPoolExecutor:
+    """Process pool for batch MarkItDown conversions, started on first use."""
+    global _office_pool
+    with _office_pool_lock:
+        if _office_pool is None:
+            # spawn - forking a process that runs Docling/Celery threads is not safe
+            _office_pool = ProcessPoolExecutor(
+                max_workers=OFFICE_POOL_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+    return _office_pool
+
+
+def _read_all(file: BinaryIO) -> bytes:
+    file.seek(0)
+    return file.read()
+
+
+class _ImageCollector:
+    """Names table and picture images in reading order as the document is serialized."""
+
+    def __init__(self):
+        self.pending: List[Tuple[str, str, object]] = []  # (image_type, image_name, pil_image)
+        self._names = {}
+        self._counters = {"table": 0, "picture": 0}
+
+    def add(self, item, image_type: str, extension: str) -> str:
+        image_name = self._names.get(item.self_ref)
+        if image_name is None:
+            self._counters[image_type] += 1
+            image_name = f"{image_type}-{self._counters[image_type]}.{extension}"
+            self._names[item.self_ref] = image_name
+            self.pending.append((image_type, image_name, item.image.pil_image))
+        return image_name
+
+
+class _CollectingTableSerializer(MarkdownTableSerializer):
+    def __init__(self, collector: _ImageCollector):
+        self._collector = collector
+
+    def serialize(self, *, item: TableItem, doc_serializer, doc, **kwargs):
+        if item.image and item.self_ref not in doc_serializer.get_excluded_refs(**kwargs):
+            self._collector.add(item, "table", "png")
+        return super().serialize(item=item, doc_serializer=doc_serializer, doc=doc, **kwargs)
+
+
+class _CollectingPictureSerializer(MarkdownPictureSerializer):
+    def __init__(self, collector: _ImageCollector):
+        self._collector = collector
+
+    def serialize(self, *, item: PictureItem, doc_serializer, doc, **kwargs):
+        if item.image and item.self_ref not in doc_serializer.get_excluded_refs(**kwargs):
+            # The picture's filename takes the place of the image placeholder
+            kwargs["image_placeholder"] = self._collector.add(item, "picture", PICTURE_FORMAT)
+        return super().serialize(item=item, doc_serializer=doc_serializer, doc=doc, **kwargs)
+
 
 class DocumentConversionBase(ABC):
     @abstractmethod
-    def convert(self, document: Tuple[str, BytesIO], **kwargs) -> ConversionResult:
+    def convert(self, document: Tuple[str, BinaryIO], **kwargs) -> ConversionResult:
         pass
 
     @abstractmethod
-    def convert_batch(self, documents: List[Tuple[str, BytesIO]], **kwargs) -> List[ConversionResult]:
+    def convert_batch(self, documents: List[Tuple[str, BinaryIO]], **kwargs) -> List[ConversionResult]:
         pass
 
 
@@ -52,18 +178,43 @@ class DoclingDocumentConversion(DocumentConversionBase):
 
     def __init__(self, pipeline_options: PdfPipelineOptions = None):
         self.pipeline_options = pipeline_options if pipeline_options else self._setup_default_pipeline_options()
+        # Converters keep their loaded models, so one is built per option combination and reused.
+        # Bounded per instance (a class-level lru_cache would be shared across instances).
+        self._cached_converter = lru_cache(maxsize=CONVERTER_CACHE_SIZE)(self._make_converter)
+        # lru_cache does not stop two threads from building the same converter concurrently
+        self._converter_lock = threading.Lock()
+
+    def _get_converter(self, extract_tables: bool, image_resolution_scale: int) -> DocumentConverter:
+        with self._converter_lock:
+            return self._cached_converter(extract_tables, image_resolution_scale)
+
+    def _make_converter(self, extract_tables: bool, image_resolution_scale: int) -> DocumentConverter:
+        # Each converter gets its own copy of the options, so cached converters never share state
+        pipeline_options = self.pipeline_options.model_copy(
+            update={"images_scale": image_resolution_scale, "generate_table_images": extract_tables},
+            deep=True,
+        )
+        return DocumentConverter(
+            format_options={
+                InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options),
+                InputFormat.IMAGE: ImageFormatOption(pipeline_options=pipeline_options),
+            }
+        )
 
-    def _update_pipeline_options(self, extract_tables: bool, image_resolution_scale: int) -> PdfPipelineOptions:
-        self.pipeline_options.images_scale = image_resolution_scale
-        self.pipeline_options.generate_table_images = extract_tables
-        return self.pipeline_options
+    def prewarm(self, extract_tables: bool = False, image_resolution_scale: int = IMAGE_RESOLUTION_SCALE) -> None:
+        """Build the converter for the default options and load its PDF pipeline models."""
+        self._get_converter(extract_tables, image_resolution_scale).initialize_pipeline(InputFormat.PDF)
 
     @staticmethod
     def _setup_default_pipeline_options() -> PdfPipelineOptions:
         pipeline_options = PdfPipelineOptions()
         pipeline_options.generate_page_images = False
         pipeline_options.generate_picture_images = True
-        pipeline_options.ocr_options = EasyOcrOptions(lang=["cs", "en"])  # Czech + English
+        if OCR_ENGINE == "rapidocr":
+            # ONNX Runtime inference - faster on CPU, but its models do not cover Czech diacritics as well
+            pipeline_options.ocr_options = RapidOcrOptions(backend="onnxruntime")
+        else:
+            pipeline_options.ocr_options = EasyOcrOptions(lang=["cs", "en"])  # Czech + English
 
         return pipeline_options
 
@@ -77,14 +228,12 @@ class DoclingDocumentConversion(DocumentConversionBase):
         Note: Legacy formats (.doc, .xls, .ppt) are NOT supported.
         """
         # Only modern Office formats (OpenXML) - legacy formats not supported
-        office_extensions = {'.docx', '.xlsx', '.pptx'}
-        return any(filename.lower().endswith(ext) for ext in office_extensions)
+        return file_extension(filename) in OFFICE_EXTENSIONS
 
     @staticmethod
     def _is_markdown_document(filename: str) -> bool:
         """Check if file is Markdown document (no conversion needed)."""
-        markdown_extensions = {'.md', '.markdown'}
-        return any(filename.lower().endswith(ext) for ext in markdown_extensions)
+        return file_extension(filename) in MARKDOWN_EXTENSIONS
 
     @staticmethod
     def _needs_hierarchical_postprocessing(filename: str) -> bool:
@@ -94,19 +243,32 @@ class DoclingDocumentConversion(DocumentConversionBase):
         which are only available for PDF and IMAGE formats (not HTML/MD/AsciiDoc).
         """
         # Only PDF and image formats have layout predictions and provenance data
-        pdf_image_extensions = {'.pdf', '.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp'}
-        return any(filename.lower().endswith(ext) for ext in pdf_image_extensions)
+        return file_extension(filename) in LAYOUT_EXTENSIONS
 
     @staticmethod
-    def _convert_markdown_passthrough(filename: str, file: BytesIO) -> ConversionResult:
+    def _has_section_headers(conv_res) -> bool:
+        """Check if the document has any section header for ResultPostprocessor to arrange.
+
+        Without a source, the postprocessor cannot read the PDF outline and builds the hierarchy
+        from section headers only - with none it walks the whole tree and changes nothing.
+        """
+        return any(isinstance(item, SectionHeaderItem) for item in conv_res.document.texts)
+
+    @staticmethod
+    def _convert_markdown_passthrough(filename: str, file: BinaryIO) -> ConversionResult:
         """Pass through Markdown files as-is (already in target format).
 
         Markdown files are already in Markdown format, so no conversion is needed.
         Simply read and return the content.
         """
         try:
-            file.seek(0)
-            content = file.read().decode('utf-8')
+            if isinstance(file, BytesIO):
+                # getvalue() needs no seek and reuses the buffer when nothing else holds a view of it
+                data = file.getvalue()
+            else:
+                file.seek(0)
+                data = file.read()
+            content = data.decode('utf-8') if data else ""
 
             from pathlib import Path
             doc_filename = Path(filename).stem
@@ -126,7 +288,7 @@ class DoclingDocumentConversion(DocumentConversionBase):
             )
 
     @staticmethod
-    def _convert_with_markitdown(filename: str, file: BytesIO) -> ConversionResult:
+    def _convert_with_markitdown(filename: str, file: BinaryIO) -> ConversionResult:
         """Convert Office documents using MarkItDown.
 
         MarkItDown is Microsoft's official tool for converting Office documents
@@ -134,68 +296,78 @@ class DoclingDocumentConversion(DocumentConversionBase):
         for DOCX/XLSX/PPTX files.
         """
         try:
-            md = MarkItDown()
-
-            # MarkItDown needs file-like object with name attribute
-            file.name = filename
-            result = md.convert_stream(file)
-
-            # MarkItDown returns text_content (markdown string)
-            markdown = result.text_content
-
-            # Extract filename without extension
-            from pathlib import Path
-            doc_filename = Path(filename).stem
-
-            return ConversionResult(
-                filename=doc_filename,
-                markdown=markdown,
-                images=[]  # MarkItDown doesn't extract images separately
-            )
-
+            markdown = convert_to_markdown(filename, file)
         except Exception as e:
             logging.error(f"MarkItDown failed to convert {filename}: {str(e)}")
-            from pathlib import Path
-            return ConversionResult(filename=Path(filename).stem, error=str(e))
+            return DoclingDocumentConversion._markitdown_result(filename, None, str(e))
+        return DoclingDocumentConversion._markitdown_result(filename, markdown, None)
 
     @staticmethod
-    def _process_document_images(conv_res) -> Tuple[str, List[ImageData]]:
-        images = []
-        table_counter = 0
-        picture_counter = 0
-        content_md = conv_res.document.export_to_markdown(image_mode=ImageRefMode.PLACEHOLDER)
-
-        for element, _level in conv_res.document.iterate_items():
-            if isinstance(element, (TableItem, PictureItem)) and element.image:
-                img_buffer = BytesIO()
-                element.image.pil_image.save(img_buffer, format="PNG")
-
-                if isinstance(element, TableItem):
-                    table_counter += 1
-                    image_name = f"table-{table_counter}.png"
-                    image_type = "table"
-                else:
-                    picture_counter += 1
-                    image_name = f"picture-{picture_counter}.png"
-                    image_type = "picture"
-                    content_md = content_md.replace("<!-- image -->", image_name, 1)
+    def _markitdown_result(filename: str, markdown: Optional[str], error: Optional[str]) -> ConversionResult:
+        from pathlib import Path
+        if error is not None:
+            return ConversionResult(filename=Path(filename).stem, error=error)
+        return ConversionResult(
+            filename=Path(filename).stem,
+            markdown=markdown,
+            images=[]  # MarkItDown doesn't extract images separately
+        )
 
-                image_bytes = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
-                images.append(ImageData(type=image_type, filename=image_name, image=image_bytes))
+    @staticmethod
+    def _process_document_images(conv_res, picture_max_dim: Optional[int] = None) -> Tuple[str, List[ImageData]]:
+        document = conv_res.document
+
+        # Nothing has an image to extract (e.g. text-only PDFs converted without table images) -
+        # the flat item lists are cheap to scan
+        if not any(item.image for item in itertools.chain(document.tables, document.pictures)):
+            return document.export_to_markdown(image_mode=ImageRefMode.PLACEHOLDER), []
+
+        # A single walk over the tree: the images are collected while the markdown is serialized,
+        # and each picture is written out under its filename instead of a placeholder
+        collector = _ImageCollector()
+        serializer = MarkdownDocSerializer(
+            doc=document,
+            table_serializer=_CollectingTableSerializer(collector),
+            picture_serializer=_CollectingPictureSerializer(collector),
+            params=MarkdownParams(image_mode=ImageRefMode.PLACEHOLDER),
+        )
+        content_md = serializer.serialize().text
+        pending = collector.pending
+
+        # Image encoding is CPU-bound and releases the GIL, so images are encoded in parallel
+        encoded = _IMAGE_ENCODER_POOL.map(
+            _encode_image,
+            [
+                ("png", pil_image, None) if image_type == "table" else (PICTURE_FORMAT, pil_image, picture_max_dim)
+                for image_type, _, pil_image in pending
+            ],
+        )
+        images = [
+            ImageData(type=image_type, filename=image_name, image=image_data)
+            for (image_type, image_name, _), image_data in zip(pending, encoded)
+        ]
 
         return content_md, images
 
+    @staticmethod
+    def _as_bytes_io(file: BinaryIO) -> BytesIO:
+        """Docling's DocumentStream only accepts BytesIO - load other streams (e.g. spooled uploads) once."""
+        if isinstance(file, BytesIO):
+            return file
+        file.seek(0)
+        return BytesIO(file.read())
+
     def convert(
         self,
-        document: Tuple[str, BytesIO],
+        document: Tuple[str, BinaryIO],
         extract_tables: bool = False,
         image_resolution_scale: int = IMAGE_RESOLUTION_SCALE,
+        picture_max_dim: Optional[int] = None,
     ) -> ConversionResult:
         filename, file = document
 
         # Check for unsupported legacy Office formats
-        legacy_extensions = {'.doc', '.xls', '.ppt'}
-        if any(filename.lower().endswith(ext) for ext in legacy_extensions):
+        if file_extension(filename) in LEGACY_OFFICE_EXTENSIONS:
             from pathlib import Path
             error_msg = (
                 f"Legacy Office format not supported: {Path(filename).suffix}. "
@@ -213,24 +385,20 @@ class DoclingDocumentConversion(DocumentConversionBase):
             return self._convert_markdown_passthrough(filename, file)
 
         # All other documents → Docling (PDF, IMAGE, HTML, AsciiDoc, CSV, etc.)
-        pipeline_options = self._update_pipeline_options(extract_tables, image_resolution_scale)
-        doc_converter = DocumentConverter(
-            format_options={
-                InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options),
-                InputFormat.IMAGE: ImageFormatOption(pipeline_options=pipeline_options),
-            }
-        )
+        doc_converter = self._get_converter(extract_tables, image_resolution_scale)
 
-        if filename.lower().endswith('.csv'):
+        if file_extension(filename) == 'csv':
             file, error = handle_csv_file(file)
             if error:
                 return ConversionResult(filename=filename, error=error)
 
-        conv_res = doc_converter.convert(DocumentStream(name=filename, stream=file), raises_on_error=False)
+        conv_res = doc_converter.convert(
+            DocumentStream(name=filename, stream=self._as_bytes_io(file)), raises_on_error=False
+        )
 
         # Apply hierarchical postprocessing ONLY for PDF/IMAGE formats
         # (requires provenance data and layout predictions not available in HTML/AsciiDoc/etc)
-        if self._needs_hierarchical_postprocessing(filename):
+        if self._needs_hierarchical_postprocessing(filename) and self._has_section_headers(conv_res):
             ResultPostprocessor(conv_res).process()
 
         doc_filename = conv_res.input.file.stem
@@ -239,120 +407,121 @@ class DoclingDocumentConversion(DocumentConversionBase):
             logging.error(f"Failed to convert {filename}: {conv_res.errors[0].error_message}")
             return ConversionResult(filename=doc_filename, error=conv_res.errors[0].error_message)
 
-        content_md, images = self._process_document_images(conv_res)
+        content_md, images = self._process_document_images(conv_res, picture_max_dim)
 
-        # Extract page count from Docling document
-        pages = None
-        try:
-            if hasattr(conv_res, 'document') and hasattr(conv_res.document, 'num_pages'):
-                # num_pages is a method, not a property
-                pages = conv_res.document.num_pages()
-        except Exception as e:
-            logging.debug(f"Could not extract page count: {e}")
-
-        return ConversionResult(filename=doc_filename, markdown=content_md, images=images, pages=pages)
+        # num_pages is a method, not a property
+        return ConversionResult(
+            filename=doc_filename, markdown=content_md, images=images, pages=conv_res.document.num_pages()
+        )
 
     def convert_batch(
         self,
-        documents: List[Tuple[str, BytesIO]],
+        documents: List[Tuple[str, BinaryIO]],
         extract_tables: bool = False,
         image_resolution_scale: int = IMAGE_RESOLUTION_SCALE,
+        picture_max_dim: Optional[int] = None,
     ) -> List[ConversionResult]:
         results = []
 
-        # Split documents by type: Office, Markdown, or Docling-based
-        office_docs = []
-        markdown_docs = []
-        docling_docs = []
-
-        for filename, file in documents:
-            if self._is_office_document(filename):
-                office_docs.append((filename, file))
-            elif self._is_markdown_document(filename):
-                markdown_docs.append((filename, file))
-            else:
-                docling_docs.append((filename, file))
-
-        # Process Office documents with MarkItDown
-        for filename, file in office_docs:
-            results.append(self._convert_with_markitdown(filename, file))
-
-        # Process Markdown documents with pass-through
-        for filename, file in markdown_docs:
-            results.append(self._convert_markdown_passthrough(filename, file))
-
-        # Process other documents with Docling (PDF, IMAGE, HTML, AsciiDoc, CSV, etc.)
-        if docling_docs:
-            pipeline_options = self._update_pipeline_options(extract_tables, image_resolution_scale)
-            doc_converter = DocumentConverter(
-                format_options={
-                    InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options),
-                    InputFormat.IMAGE: ImageFormatOption(pipeline_options=pipeline_options),
-                }
+        # Split documents by type: Office, Markdown, or Docling-based - one lookup per file
+        groups = {"office": [], "markdown": [], "docling": []}
+        positions = {"office": [], "markdown": [], "docling": []}
+        for position, (filename, file) in enumerate(documents):
+            group = _EXTENSION_GROUPS.get(file_extension(filename), "docling")
+            groups[group].append((filename, file))
+            positions[group].append(position)
+        office_docs, markdown_docs, docling_docs = groups["office"], groups["markdown"], groups["docling"]
+
+        # Process Office documents with MarkItDown. It is pure Python, so several documents - or one
+        # alongside a Docling sub-batch - run in worker processes, overlapping with the work below.
+        # (daemonic processes, e.g. pool workers, may not start children - convert inline there)
+        use_pool = len(office_docs) > 1 or (office_docs and docling_docs)
+        office_pooled = use_pool and not multiprocessing.current_process().daemon
+        if office_pooled:
+            office_filenames = [filename for filename, _ in office_docs]
+            office_outputs = _get_office_pool().map(
+                convert_office_document, office_filenames, [_read_all(file) for _, file in office_docs]
             )
-
-            conv_results = doc_converter.convert_all(
-                [DocumentStream(name=filename, stream=file) for filename, file in docling_docs],
-                raises_on_error=False,
+            office_results = (
+                self._markitdown_result(filename, *output) for filename, output in zip(office_filenames, office_outputs)
             )
 
-            for conv_res, (filename, _) in zip(conv_results, docling_docs):
-                # Apply hierarchical postprocessing ONLY for PDF/IMAGE formats
-                # (requires provenance data and layout predictions not available in HTML/AsciiDoc/etc)
-                if self._needs_hierarchical_postprocessing(filename):
-                    ResultPostprocessor(conv_res).process()
+        # Everything else converted outside Docling runs on threads, so it overlaps with convert_all
+        inline_workers = min(8, len(markdown_docs) + (0 if office_pooled else len(office_docs))) or 1
+        with ThreadPoolExecutor(max_workers=inline_workers, thread_name_prefix="batch-inline") as inline_pool:
+            if not office_pooled:
+                office_results = inline_pool.map(lambda doc: self._convert_with_markitdown(*doc), office_docs)
+
+            # Process Markdown documents with pass-through
+            markdown_results = inline_pool.map(lambda doc: self._convert_markdown_passthrough(*doc), markdown_docs)
+
+            # Process other documents with Docling (PDF, IMAGE, HTML, AsciiDoc, CSV, etc.)
+            if docling_docs:
+                doc_converter = self._get_converter(extract_tables, image_resolution_scale)
+
+                conv_results = doc_converter.convert_all(
+                    [DocumentStream(name=filename, stream=self._as_bytes_io(file)) for filename, file in docling_docs],
+                    raises_on_error=False,
+                )
 
-                doc_filename = conv_res.input.file.stem
+                for conv_res, (filename, _) in zip(conv_results, docling_docs):
+                    # Apply hierarchical postprocessing ONLY for PDF/IMAGE formats
+                    # (requires provenance data and layout predictions not available in HTML/AsciiDoc/etc)
+                    if self._needs_hierarchical_postprocessing(filename) and self._has_section_headers(conv_res):
+                        ResultPostprocessor(conv_res).process()
 
-                if conv_res.errors:
-                    logging.error(f"Failed to convert {conv_res.input.name}: {conv_res.errors[0].error_message}")
-                    results.append(ConversionResult(filename=conv_res.input.name, error=conv_res.errors[0].error_message))
-                    continue
+                    doc_filename = conv_res.input.file.stem
 
-                content_md, images = self._process_document_images(conv_res)
+                    if conv_res.errors:
+                        logging.error(f"Failed to convert {conv_res.input.name}: {conv_res.errors[0].error_message}")
+                        results.append(ConversionResult(filename=conv_res.input.name, error=conv_res.errors[0].error_message))
+                        continue
 
-                # Extract page count from Docling document
-                pages = None
-                try:
-                    if hasattr(conv_res, 'document') and hasattr(conv_res.document, 'num_pages'):
-                        # num_pages is a method, not a property
-                        pages = conv_res.document.num_pages()
-                except Exception as e:
-                    logging.debug(f"Could not extract page count: {e}")
+                    content_md, images = self._process_document_images(conv_res, picture_max_dim)
 
-                results.append(ConversionResult(filename=doc_filename, markdown=content_md, images=images, pages=pages))
+                    # num_pages is a method, not a property
+                    results.append(ConversionResult(
+                        filename=doc_filename, markdown=content_md, images=images, pages=conv_res.document.num_pages()
+                    ))
 
-        return results
+            # Results in the order of the input documents
+            ordered_results: List[Optional[ConversionResult]] = [None] * len(documents)
+            for group, group_results in (("office", office_results), ("markdown", markdown_results), ("docling", results)):
+                for position, result in zip(positions[group], group_results):
+                    ordered_results[position] = result
+            return ordered_results
 
 
 class DocumentConverterService:
     def __init__(self, document_converter: DocumentConversionBase):
         self.document_converter = document_converter
 
-    def convert_document(self, document: Tuple[str, BytesIO], **kwargs) -> ConversionResult:
+    def convert_document(self, document: Tuple[str, BinaryIO], **kwargs) -> ConversionResult:
         result = self.document_converter.convert(document, **kwargs)
         if result.error:
             logging.error(f"Failed to convert {document[0]}: {result.error}")
             raise HTTPException(status_code=500, detail=result.error)
         return result
 
-    def convert_documents(self, documents: List[Tuple[str, BytesIO]], **kwargs) -> List[ConversionResult]:
+    def convert_documents(self, documents: List[Tuple[str, BinaryIO]], **kwargs) -> List[ConversionResult]:
         return self.document_converter.convert_batch(documents, **kwargs)
 
     def convert_document_task(
         self,
-        document: Tuple[str, bytes],
+        document: Tuple[str, Union[bytes, BinaryIO]],
         **kwargs,
     ) -> ConversionResult:
-        document = (document[0], BytesIO(document[1]))
-        return self.document_converter.convert(document, **kwargs)
+        filename, data = document
+        # Files (e.g. an open payload) are converted as they are, without reading them up front
+        file = BytesIO(data) if isinstance(data, bytes) else data
+        return self.document_converter.convert((filename, file), **kwargs)
 
     def convert_documents_task(
         self,
-        documents: List[Tuple[str, bytes]],
+        documents: List[Tuple[str, Union[bytes, BinaryIO]]],
         **kwargs,
     ) -> List[ConversionResult]:
-        documents = [(filename, BytesIO(file)) for filename, file in documents]
+        documents = [(filename, BytesIO(data) if isinstance(data, bytes) else data) for filename, data in documents]
         return self.document_converter.convert_batch(documents, **kwargs)
 
     def get_single_document_task_result(self, job_id: str) -> ConversationJobResult:
@@ -374,7 +543,7 @@ class DocumentConverterService:
             if result.get('error'):
                 return ConversationJobResult(job_id=job_id, status="FAILURE", error=result['error'])
 
-            return ConversationJobResult(job_id=job_id, status="SUCCESS", result=ConversionResult(**result))
+            return ConversationJobResult(job_id=job_id, status="SUCCESS", result=ConversionResult.model_validate(result))
 
         else:
             return ConversationJobResult(job_id=job_id, status="FAILURE", error=str(task.result))
@@ -394,16 +563,21 @@ class DocumentConverterService:
 
         # Task completed successfully, but need to check individual conversion results
         if task.state == 'SUCCESS':
-            conversion_results = task.get()
+            # The documents' results are kept by their own tasks, saved as a group under the batch job id
+            batch = GroupResult.restore(job_id, app=task.app)
+            # Batches submitted as a single convert_documents task hold the results themselves
+            conversion_results = batch.get(propagate=False) if batch is not None else task.get()
+            if conversion_results is None:
+                return BatchConversionJobResult(job_id=job_id, status="FAILURE", error="Batch results expired")
             job_results = []
 
             for result in conversion_results:
                 if result.get('error'):
                     job_result = ConversationJobResult(status="FAILURE", error=result['error'])
                 else:
-                    job_result = ConversationJobResult(
-                        status="SUCCESS", result=ConversionResult(**result).model_dump(exclude_unset=True)
-                    )
+                    # The model itself, not a dump of it - nested models are not revalidated, and
+                    # the fields set from the worker's dict still drive response_model_exclude_unset
+                    job_result = ConversationJobResult(status="SUCCESS", result=ConversionResult.model_validate(result))
                 job_results.append(job_result)
 
             return BatchConversionJobResult(job_id=job_id, status="SUCCESS", conversion_results=job_results)
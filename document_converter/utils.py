@@ -1,9 +1,12 @@
+import codecs
 from io import BytesIO
 import re
+from dataclasses import dataclass
 from enum import Enum
 from typing import Dict, List, Optional, Tuple
 
 import filetype
+from charset_normalizer import from_bytes
 
 
 class InputFormat(str, Enum):
@@ -66,19 +69,27 @@ FormatToMimeType: Dict[InputFormat, List[str]] = {
     InputFormat.CSV: ["text/csv"],
 }
 MimeTypeToFormat = {mime: fmt for fmt, mimes in FormatToMimeType.items() for mime in mimes}
+ExtensionToFormat: Dict[str, InputFormat] = {ext: fmt for fmt, exts in FormatToExtensions.items() for ext in exts}
+ExtensionToMime: Dict[str, str] = {ext: FormatToMimeType[fmt][0] for ext, fmt in ExtensionToFormat.items()}
+
+
+# HTML/XHTML is recognised by how the document starts - only its head is inspected
+_HTML_SNIFF_BYTES = 4096
+_RE_COMMENT = re.compile(rb"<!--(.*?)-->", re.DOTALL)
+_RE_XML = re.compile(rb"<\?xml")
+_RE_HTML = re.compile(rb"<!doctype\s+html|<html|<head|<body")
 
 
 def detect_html_xhtml(content):
-    content_str = content.decode("ascii", errors="ignore").lower()
+    head = content[:_HTML_SNIFF_BYTES].removeprefix(codecs.BOM_UTF8).lower()
     # Remove XML comments
-    content_str = re.sub(r"<!--(.*?)-->", "", content_str, flags=re.DOTALL)
-    content_str = content_str.lstrip()
+    head = _RE_COMMENT.sub(b"", head).lstrip()
 
-    if re.match(r"<\?xml", content_str):
-        if "xhtml" in content_str[:1000]:
+    if _RE_XML.match(head):
+        if b"xhtml" in head[:1000]:
             return "application/xhtml+xml"
 
-    if re.match(r"<!doctype\s+html|<html|<head|<body", content_str):
+    if _RE_HTML.match(head):
         return "text/html"
 
     return None
@@ -86,7 +97,7 @@ def detect_html_xhtml(content):
 
 def is_csv_file(filename: str) -> bool:
     """Check if a file is a CSV based on its extension."""
-    return filename and filename.lower().endswith('.csv')
+    return bool(filename) and file_extension(filename) == 'csv'
 
 
 def guess_format(obj: bytes, filename: str = None):
@@ -99,14 +110,12 @@ def guess_format(obj: bytes, filename: str = None):
         if is_csv_file(filename):
             return InputFormat.CSV
 
-        mime = filetype.guess_mime(content)
+        # A known extension decides the format - magic bytes are only checked without one
+        ext = file_extension(filename) if filename and not filename.startswith(".") else ""
+        if ext in ExtensionToFormat:
+            return ExtensionToFormat[ext]
 
-        # If MIME detection failed or returned unknown type, try extension fallback
-        if mime is None or mime not in MimeTypeToFormat:
-            ext = filename.rsplit(".", 1)[-1] if ("." in filename and not filename.startswith(".")) else ""
-            extension_mime = mime_from_extension(ext)
-            if extension_mime:
-                mime = extension_mime
+        mime = filetype.guess_mime(content)
 
     mime = mime or detect_html_xhtml(content)
     mime = mime or "text/plain"
@@ -114,17 +123,30 @@ def guess_format(obj: bytes, filename: str = None):
 
 
 def handle_csv_file(file: BytesIO) -> Tuple[BytesIO, Optional[str]]:
-    """Handle CSV file encoding by trying multiple encodings.
+    """Handle CSV file encoding - UTF-8 is passed through, other encodings are detected and re-encoded.
 
     Returns:
         Tuple[BytesIO, Optional[str]]: (processed file, error message if any)
     """
     SUPPORTED_CSV_ENCODINGS = ['utf-8', 'latin1', 'cp1252', 'iso-8859-1']
-    for encoding in SUPPORTED_CSV_ENCODINGS:
+    file.seek(0)
+    raw = file.read()
+    try:
+        raw.decode('utf-8')
+    except UnicodeDecodeError:
+        pass
+    else:
+        # Already UTF-8 - BytesIO shares the bytes object instead of copying a re-encoded one
+        return BytesIO(raw), None
+
+    # One detection pass instead of trial-decoding every supported encoding
+    best = from_bytes(raw).best()
+    if best is not None:
+        return BytesIO(str(best).encode('utf-8')), None
+
+    for encoding in SUPPORTED_CSV_ENCODINGS[1:]:
         try:
-            file.seek(0)
-            content = file.read().decode(encoding)
-            return BytesIO(content.encode('utf-8')), None
+            return BytesIO(raw.decode(encoding).encode('utf-8')), None
         except UnicodeDecodeError:
             continue
     return file, f"Could not decode CSV file. Supported encodings: {', '.join(SUPPORTED_CSV_ENCODINGS)}"
@@ -132,21 +154,41 @@ def handle_csv_file(file: BytesIO) -> Tuple[BytesIO, Optional[str]]:
 
 def mime_from_extension(ext):
     """Get MIME type from file extension."""
-    mime = None
+    return ExtensionToMime.get(ext.lower())
+
+
+LEGACY_OFFICE_EXTENSIONS = frozenset({"doc", "xls", "ppt"})
 
-    # Check all format mappings
-    for input_format in InputFormat:
-        if ext in FormatToExtensions.get(input_format, []):
-            mime = FormatToMimeType.get(input_format, [None])[0]
-            break
 
-    return mime
+@dataclass(frozen=True)
+class FormatInfo:
+    """Result of upload format detection."""
+    format: Optional[InputFormat]
+    supported: bool
+    legacy: bool
+
+
+def file_extension(filename: str) -> str:
+    """Lowercased extension of a filename without the dot ("" if there is none)."""
+    _, dot, ext = filename.rpartition(".")
+    return ext.lower() if dot else ""
+
+
+def detect_format(head: bytes, filename: str) -> FormatInfo:
+    """Detect the format of an upload from its leading bytes and filename in one pass.
+
+    Legacy Office files are rejected by extension alone, without inspecting content.
+    """
+    if file_extension(filename) in LEGACY_OFFICE_EXTENSIONS:
+        return FormatInfo(format=None, supported=False, legacy=True)
+
+    input_format = guess_format(head, filename)
+    return FormatInfo(format=input_format, supported=input_format in FormatToExtensions, legacy=False)
 
 
 def is_legacy_office_format(filename: str) -> bool:
     """Check if file is a legacy Office format (.doc, .xls, .ppt)."""
-    legacy_extensions = {'.doc', '.xls', '.ppt'}
-    return any(filename.lower().endswith(ext) for ext in legacy_extensions)
+    return file_extension(filename) in LEGACY_OFFICE_EXTENSIONS
 
 
 def is_file_format_supported(file_bytes: bytes, filename: str) -> bool:
@@ -1,18 +1,41 @@
+import asyncio
 import logging
+import os
 from contextlib import asynccontextmanager
 
+import anyio.to_thread
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from document_converter.route import router as document_converter_router
 from document_converter.health import router as health_router
+from worker import payload_store
 
 logger = logging.getLogger(__name__)
 
+# Worker threads for blocking work (sync endpoints, Celery result waits, upload I/O);
+# synchronous conversions have their own threads (MDCONVERT_CONVERSION_WORKERS)
+THREADPOOL_SIZE = int(os.getenv("MDCONVERT_THREADPOOL_SIZE", "64"))
+
+# How often abandoned upload payloads (tasks revoked or lost before they ran) are swept
+PAYLOAD_SWEEP_INTERVAL = 3600
+
+
+async def _sweep_payloads_periodically():
+    while True:
+        try:
+            await anyio.to_thread.run_sync(payload_store.sweep)
+        except Exception as e:
+            logger.error(f"Failed to sweep payloads: {e}")
+        await asyncio.sleep(PAYLOAD_SWEEP_INTERVAL)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize resources on startup and cleanup on shutdown."""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
     # Startup: Initialize SQLite database
     try:
         from audit import init_db
@@ -23,10 +46,20 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Failed to initialize audit database: {e}")
 
+    sweeper = asyncio.create_task(_sweep_payloads_periodically())
+
     yield
 
-    # Shutdown: Cleanup if needed
-    pass
+    sweeper.cancel()
+
+    # Shutdown: Write audit events still waiting in the write-behind queue
+    try:
+        from audit import flush_audit
+        flush_audit()
+    except ImportError:
+        pass
+    except Exception as e:
+        logger.error(f"Failed to flush audit database: {e}")
 
 
 app = FastAPI(
@@ -34,6 +67,8 @@ app = FastAPI(
     description="Convert documents (PDF, DOCX, images) to Markdown with OCR support",
     version="1.0.0",
     lifespan=lifespan,
+    # orjson - results can carry megabytes of base64 image data
+    default_response_class=ORJSONResponse,
 )
 
 
@@ -3,9 +3,35 @@ from celery import Celery
 from dotenv import load_dotenv
 
 load_dotenv(".env")
+
+# Seconds before Redis redelivers a task that no worker acknowledged
+VISIBILITY_TIMEOUT = int(os.getenv("MDCONVERT_VISIBILITY_TIMEOUT", str(6 * 3600)))
+
 celery_app = Celery(
     "document_converter",
     broker=os.environ.get("REDIS_HOST", "redis://localhost:6379/0"),
     backend=os.environ.get("REDIS_HOST", "redis://localhost:6379/0"),
     include=["worker.tasks"],
 )
+
+# msgpack carries extracted images as raw bytes - JSON would need them base64-encoded
+celery_app.conf.update(
+    task_serializer="msgpack",
+    result_serializer="msgpack",
+    accept_content=["msgpack", "json"],
+    # Conversions take seconds to minutes - reserve one task at a time, so queued
+    # documents (e.g. of a batch) go to whichever worker is free
+    worker_prefetch_multiplier=1,
+    # Acknowledge a task when it finishes, so a conversion lost with its whole worker (node
+    # restart, crash) is redelivered instead of vanishing. With the prefork pool the workers run,
+    # a pool process killed mid-task (e.g. OOM) fails its task rather than requeueing it
+    # (task_reject_on_worker_lost stays off) - a document that always exhausts memory cannot loop
+    # through the workers. (Under --pool=solo that kill takes the whole worker down instead, and
+    # the unacknowledged task is redelivered every time.)
+    task_acks_late=True,
+    # An unacknowledged task is redelivered once the visibility timeout expires - it must
+    # outlast the longest conversion, or a running conversion is started a second time
+    broker_transport_options={"visibility_timeout": VISIBILITY_TIMEOUT},
+    # LLM postprocessing waits on the network - its own queue and workers keep it off the conversion workers
+    task_routes={"analyze_document": {"queue": "llm"}},
+)
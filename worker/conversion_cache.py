@@ -0,0 +1,143 @@
+"""
+Content-addressed cache of conversion results.
+
+Results are keyed by the SHA-256 of the document bytes plus every option that
+changes the output, so re-submitting the same file skips the conversion.
+Entries live in a SQLite database shared by the workers and are evicted by
+age and by total size, oldest first. Set MDCONVERT_CONVERSION_CACHE to an
+empty string to disable the cache.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional
+
+import msgpack
+
+from document_converter.service import OCR_ENGINE, PICTURE_FORMAT
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = os.getenv("MDCONVERT_CONVERSION_CACHE", "/opt/mdconvert/data/conversion_cache.db")
+CACHE_ENABLED = bool(CACHE_PATH)
+
+# Results (images included) are kept this long, and in total at most this many bytes
+CACHE_TTL = int(os.getenv("MDCONVERT_CONVERSION_CACHE_TTL_HOURS", "168")) * 3600
+CACHE_MAX_BYTES = int(os.getenv("MDCONVERT_CONVERSION_CACHE_MAX_MB", "2048")) * 1024 * 1024
+
+_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=30000",
+]
+
+SQL_CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS conversion_cache (
+        key TEXT PRIMARY KEY,
+        result BLOB NOT NULL,
+        created_at INTEGER NOT NULL
+    )
+"""
+
+SQL_GET = "SELECT result FROM conversion_cache WHERE key = ? AND created_at > ?"
+
+SQL_PUT = "INSERT OR REPLACE INTO conversion_cache (key, result, created_at) VALUES (?, ?, ?)"
+
+SQL_EVICT_EXPIRED = "DELETE FROM conversion_cache WHERE created_at <= ?"
+
+# Drops the oldest entries past the size limit - length() of a BLOB does not read its content
+SQL_EVICT_OVERSIZE = """
+    DELETE FROM conversion_cache WHERE key IN (
+        SELECT key FROM (
+            SELECT key, SUM(length(result)) OVER (ORDER BY created_at DESC, rowid DESC) AS total
+            FROM conversion_cache
+        )
+        WHERE total > ?
+    )
+"""
+
+# One connection per thread, reused across calls
+_tls = threading.local()
+
+
+def _get_conn() -> sqlite3.Connection:
+    conn = getattr(_tls, "conn", None)
+    # A connection inherited through fork() must not be used by the child
+    if conn is None or _tls.pid != os.getpid():
+        Path(CACHE_PATH).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(CACHE_PATH, isolation_level=None)
+        for pragma in _PRAGMAS:
+            conn.execute(pragma)
+        conn.execute(SQL_CREATE_TABLE)
+        _tls.conn = conn
+        _tls.pid = os.getpid()
+    return conn
+
+
+def make_key(
+    file: BinaryIO,
+    extract_tables: bool,
+    image_resolution_scale: int,
+    picture_max_dim: Optional[int] = None,
+) -> Optional[str]:
+    """Cache key for a document and its conversion options (None with the cache disabled).
+
+    The file is left at position 0.
+    """
+    if not CACHE_ENABLED:
+        return None
+
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+
+    # Length-prefixed, so the digest covers exactly this document
+    digest = hashlib.sha256(size.to_bytes(8, "big"))
+    for chunk in iter(lambda: file.read(1024 * 1024), b""):
+        digest.update(chunk)
+    file.seek(0)
+
+    return (
+        f"{digest.hexdigest()}:{int(extract_tables)}:{image_resolution_scale}:{picture_max_dim or 0}"
+        f":{PICTURE_FORMAT}:{OCR_ENGINE}"
+    )
+
+
+def get(key: Optional[str], filename: str) -> Optional[Dict[str, Any]]:
+    """Cached result for a key, or None. The result is named after the given filename."""
+    if not CACHE_ENABLED or key is None:
+        return None
+    try:
+        row = _get_conn().execute(SQL_GET, (key, int(time.time()) - CACHE_TTL)).fetchone()
+    # OSError: the cache directory cannot be created - a conversion must not fail over its cache
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(f"Conversion cache lookup failed: {e}")
+        return None
+    if row is None:
+        return None
+
+    result = msgpack.unpackb(row[0], raw=False)
+    # The same content may have been uploaded under another name
+    result["filename"] = Path(filename).stem
+    return result
+
+
+def put(key: Optional[str], result: Dict[str, Any]) -> None:
+    """Store a successful conversion result, evicting expired entries and the oldest past the size limit."""
+    if not CACHE_ENABLED or key is None or result.get("error"):
+        return
+    now = int(time.time())
+    try:
+        conn = _get_conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(SQL_PUT, (key, msgpack.packb(result, use_bin_type=True), now))
+            conn.execute(SQL_EVICT_EXPIRED, (now - CACHE_TTL,))
+            conn.execute(SQL_EVICT_OVERSIZE, (CACHE_MAX_BYTES,))
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(f"Conversion cache write failed: {e}")
@@ -0,0 +1,95 @@
+"""
+Cache of LLM document analyses.
+
+Analyses are keyed by the SHA-256 of the prompt version and the converted
+markdown, so re-converting the same content (retries, re-uploads) skips the
+LLM call. Entries expire after a week. Set MDCONVERT_LLM_CACHE to an empty
+string to disable the cache.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = os.getenv("MDCONVERT_LLM_CACHE", "/opt/mdconvert/data/llm_cache.db")
+CACHE_ENABLED = bool(CACHE_PATH)
+
+DEFAULT_TTL = 7 * 24 * 3600
+
+_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=30000",
+]
+
+SQL_CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        hash TEXT PRIMARY KEY,
+        prompt_version TEXT NOT NULL,
+        response TEXT NOT NULL,
+        expires_at INTEGER NOT NULL
+    )
+"""
+
+SQL_GET = "SELECT response FROM llm_cache WHERE hash = ? AND expires_at > ?"
+
+SQL_PUT = "INSERT OR REPLACE INTO llm_cache (hash, prompt_version, response, expires_at) VALUES (?, ?, ?, ?)"
+
+SQL_PURGE_EXPIRED = "DELETE FROM llm_cache WHERE expires_at <= ?"
+
+# One connection per thread, reused across calls
+_tls = threading.local()
+
+
+def _get_conn() -> sqlite3.Connection:
+    conn = getattr(_tls, "conn", None)
+    # A connection inherited through fork() must not be used by the child
+    if conn is None or _tls.pid != os.getpid():
+        Path(CACHE_PATH).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(CACHE_PATH, isolation_level=None)
+        for pragma in _PRAGMAS:
+            conn.execute(pragma)
+        conn.execute(SQL_CREATE_TABLE)
+        # Expired entries are never read again - drop them whenever a connection opens
+        conn.execute(SQL_PURGE_EXPIRED, (int(time.time()),))
+        _tls.conn = conn
+        _tls.pid = os.getpid()
+    return conn
+
+
+def make_key(prompt_version: str, markdown: str) -> str:
+    """Cache key for the analysis of a markdown text with a given prompt version."""
+    return hashlib.sha256(prompt_version.encode() + b"\0" + markdown.encode("utf-8")).hexdigest()
+
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    """Cached, unexpired analysis for a key, or None."""
+    if not CACHE_ENABLED:
+        return None
+    try:
+        row = _get_conn().execute(SQL_GET, (key, int(time.time()))).fetchone()
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(f"LLM cache lookup failed: {e}")
+        return None
+    return json.loads(row[0]) if row else None
+
+
+def put(key: str, prompt_version: str, analysis: Dict[str, Any], ttl: int = DEFAULT_TTL) -> None:
+    """Store an analysis for ttl seconds."""
+    if not CACHE_ENABLED:
+        return
+    try:
+        _get_conn().execute(
+            SQL_PUT,
+            (key, prompt_version, json.dumps(analysis, ensure_ascii=False), int(time.time()) + ttl),
+        )
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(f"LLM cache write failed: {e}")
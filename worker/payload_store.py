@@ -0,0 +1,71 @@
+"""
+Hand-off of uploaded documents between the API and Celery workers.
+
+The API writes each upload to a directory shared with the workers and sends
+only the payload key through the broker, instead of the document bytes.
+Payloads are deleted by the task that converts them; sweep() removes those
+whose task never ran (revoked, expired or lost).
+"""
+
+import logging
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import BinaryIO
+
+# Must be the same (shared) directory for the API and the workers - tmpfs by default
+PAYLOAD_DIR = Path(os.getenv("MDCONVERT_PAYLOAD_DIR", "/dev/shm/docling"))
+
+# Age after which a payload is considered abandoned - well past any queueing delay
+PAYLOAD_TTL = int(os.getenv("MDCONVERT_PAYLOAD_TTL_HOURS", "24")) * 3600
+
+logger = logging.getLogger(__name__)
+
+
+def put(file: BinaryIO) -> str:
+    """Store the contents of a file object and return its payload key."""
+    PAYLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    key = uuid.uuid4().hex
+
+    file.seek(0)
+    with open(PAYLOAD_DIR / key, "wb") as payload:
+        shutil.copyfileobj(file, payload, length=1024 * 1024)
+    return key
+
+
+def get(key: str) -> bytes:
+    """Read a stored payload."""
+    return (PAYLOAD_DIR / key).read_bytes()
+
+
+def open_payload(key: str) -> BinaryIO:
+    """Open a stored payload for reading (stays readable after delete())."""
+    return open(PAYLOAD_DIR / key, "rb")
+
+
+def delete(key: str) -> None:
+    """Remove a stored payload; missing payloads are ignored."""
+    (PAYLOAD_DIR / key).unlink(missing_ok=True)
+
+
+def sweep(max_age: int = PAYLOAD_TTL) -> int:
+    """Remove payloads older than max_age seconds and return how many were removed."""
+    cutoff = time.time() - max_age
+    removed = 0
+    try:
+        entries = list(os.scandir(PAYLOAD_DIR))
+    except FileNotFoundError:
+        return 0
+
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            pass  # Deleted by its task meanwhile
+    if removed:
+        logger.info(f"Removed {removed} abandoned payloads")
+    return removed
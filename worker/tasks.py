@@ -1,12 +1,22 @@
 import logging
+import os
+import threading
 import time
-from typing import Any, Dict, List, Optional, Tuple
+from contextlib import ExitStack, contextmanager
+from dataclasses import asdict
+from io import BytesIO
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
 from document_converter.service import IMAGE_RESOLUTION_SCALE, DoclingDocumentConversion, DocumentConverterService
+from worker import conversion_cache, llm_cache, payload_store
 from worker.celery_config import celery_app
 
 # Import audit module for SQLite logging
 try:
-    from audit import update_job_started, update_job_complete, Status, analyze_document_sync
+    from audit import (
+        update_job_started, update_batch_started, update_job_complete, update_job_analysis, close_db, Status,
+        analyze_document_sync, PROMPT_VERSION,
+    )
     AUDIT_ENABLED = True
 except ImportError:
     AUDIT_ENABLED = False
@@ -14,6 +24,58 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Load the Docling models in the main worker process at startup. Disable for a prefork pool on
+# GPU - a CUDA context created before the fork is unusable in the pool processes.
+PREWARM_MODELS = os.getenv("MDCONVERT_PREWARM_MODELS", "true").lower() == "true"
+
+# One service per worker process, so cached converters (and their loaded models) survive between tasks
+_document_service: Optional[DocumentConverterService] = None
+_document_service_lock = threading.Lock()
+
+
+def get_document_service() -> DocumentConverterService:
+    global _document_service
+    with _document_service_lock:
+        if _document_service is None:
+            _document_service = DocumentConverterService(document_converter=DoclingDocumentConversion())
+    return _document_service
+
+
+@worker_init.connect
+def prewarm_document_service(sender, **kwargs):
+    """Load the models before the pool starts.
+
+    Prefork pool processes inherit the loaded models (their pages shared copy-on-write)
+    instead of each loading its own, and the solo pool - which sends no
+    worker_process_init - takes its first task warm. Workers that do not consume the
+    conversion queue (the LLM postprocessing worker) never load them.
+    """
+    if not PREWARM_MODELS or sender.app.conf.task_default_queue not in sender.app.amqp.queues.consume_from:
+        return
+    try:
+        get_document_service().document_converter.prewarm()
+    except Exception as e:
+        logger.warning(f"Failed to prewarm document converter at worker start: {e}")
+
+
+@worker_process_init.connect
+def init_document_service(**kwargs):
+    """Build the service in each pool process at boot, so the first task does not pay for it."""
+    try:
+        get_document_service()
+    except Exception as e:
+        logger.warning(f"Failed to initialize document service at worker start: {e}")
+
+
+@worker_process_shutdown.connect
+def close_audit_db(**kwargs):
+    """Pool processes exit without atexit handlers - write queued audit events and close the connections."""
+    if AUDIT_ENABLED:
+        try:
+            close_db()
+        except Exception as e:
+            logger.warning(f"Failed to close audit database at worker shutdown: {e}")
+
 
 @celery_app.task(name="celery.ping")
 def ping():
@@ -21,144 +83,213 @@ def ping():
     return "pong"
 
 
-@celery_app.task(bind=True, name="convert_document")
-def convert_document_task(
-    self,
-    document: Tuple[str, bytes],
-    extract_tables: bool = False,
-    image_resolution_scale: int = IMAGE_RESOLUTION_SCALE,
-    user_id: Optional[str] = None,
-) -> Dict[str, Any]:
-    job_id = self.request.id
-    start_time = time.time()
-
-    # Mark job as started in SQLite
-    if AUDIT_ENABLED and user_id:
-        try:
-            update_job_started(job_id)
-        except Exception as e:
-            logger.warning(f"Failed to update job started in audit: {e}")
+@contextmanager
+def _open_document(payload: Union[str, bytes]) -> Iterator[BinaryIO]:
+    """Content of a queued document, given by its payload key - the payload is deleted afterwards.
 
+    Messages queued before uploads went to the payload store carry the bytes inline.
+    """
+    if isinstance(payload, bytes):
+        yield BytesIO(payload)
+        return
     try:
-        document_service = DocumentConverterService(document_converter=DoclingDocumentConversion())
-        result = document_service.convert_document_task(
-            document, extract_tables=extract_tables, image_resolution_scale=image_resolution_scale
-        )
+        with payload_store.open_payload(payload) as file:
+            yield file
+    finally:
+        payload_store.delete(payload)
+
 
-        processing_time_ms = int((time.time() - start_time) * 1000)
-        result_dict = result.model_dump(exclude_unset=True)
+class AuditedTask(celery_app.Task):
+    """Task that records its job in the audit database - start, then success or failure.
 
-        # Mark job as completed in SQLite
-        if AUDIT_ENABLED and user_id:
+    Only jobs submitted with a user_id keyword argument are audited; a document of an
+    audited batch (batch_job_id keyword argument) marks its batch job as started. The
+    task body just converts and returns; the handlers run after it, on the same worker.
+    """
+
+    def before_start(self, task_id, args, kwargs):
+        # Monotonic - wall-clock adjustments cannot skew the measured processing time
+        self.request.audit_start_ns = time.perf_counter_ns()
+        if AUDIT_ENABLED and kwargs.get("user_id"):
+            try:
+                update_job_started(task_id)
+            except Exception as e:
+                logger.warning(f"Failed to update job started in audit: {e}")
+        if AUDIT_ENABLED and kwargs.get("batch_job_id"):
             try:
-                # LLM postprocessing for metadata extraction
-                summary = None
-                category = None
-                tags = None
-                language = None
-
-                if analyze_document_sync and result.markdown:
-                    try:
-                        analysis = analyze_document_sync(result.markdown)
-                        if analysis:
-                            summary = analysis.summary
-                            category = analysis.category
-                            tags = analysis.tags
-                            language = analysis.language
-                            logger.info(f"LLM postprocessing done: category={category}, language={language}")
-                    except Exception as llm_error:
-                        logger.warning(f"LLM postprocessing failed (non-fatal): {llm_error}")
-
-                # Extract pages from conversion result (Docling provides this for PDF/images)
-                pages = getattr(result, 'pages', None)
+                update_batch_started(kwargs["batch_job_id"])
+            except Exception as e:
+                logger.warning(f"Failed to update batch job started in audit: {e}")
 
+    def on_success(self, retval, task_id, args, kwargs):
+        if AUDIT_ENABLED and kwargs.get("user_id"):
+            try:
                 update_job_complete(
-                    job_id=job_id,
+                    job_id=task_id,
                     status=Status.SUCCESS.value,
-                    pages=pages,
-                    processing_time_ms=processing_time_ms,
+                    # Docling provides the page count for PDF/images; batch results have none
+                    pages=retval.get("pages") if isinstance(retval, dict) else None,
+                    processing_time_ms=self._processing_time_ms(),
                     result_url=None,  # Will be OneDrive URL
                     error=None,
-                    summary=summary,
-                    category=category,
-                    tags=tags,
-                    language=language,
                 )
             except Exception as e:
                 logger.warning(f"Failed to update job complete in audit: {e}")
 
-        return result_dict
-
-    except Exception as e:
-        processing_time_ms = int((time.time() - start_time) * 1000)
-
-        # Mark job as failed in SQLite
-        if AUDIT_ENABLED and user_id:
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        if AUDIT_ENABLED and kwargs.get("user_id"):
             try:
                 update_job_complete(
-                    job_id=job_id,
+                    job_id=task_id,
                     status=Status.FAILURE.value,
-                    processing_time_ms=processing_time_ms,
-                    error=str(e),
+                    processing_time_ms=self._processing_time_ms(),
+                    error=str(exc),
                 )
-            except Exception as audit_error:
-                logger.warning(f"Failed to update job failure in audit: {audit_error}")
+            except Exception as e:
+                logger.warning(f"Failed to update job failure in audit: {e}")
 
-        raise
+    def _processing_time_ms(self) -> Optional[int]:
+        start_ns = getattr(self.request, "audit_start_ns", None)
+        return (time.perf_counter_ns() - start_ns) // 1_000_000 if start_ns is not None else None
 
 
-@celery_app.task(bind=True, name="convert_documents")
-def convert_documents_task(
+@celery_app.task(bind=True, base=AuditedTask, name="convert_document")
+def convert_document_task(
     self,
-    documents: List[Tuple[str, bytes]],
+    document: Tuple[str, Union[str, bytes]],
     extract_tables: bool = False,
     image_resolution_scale: int = IMAGE_RESOLUTION_SCALE,
+    picture_max_dim: Optional[int] = None,
     user_id: Optional[str] = None,
-) -> List[Dict[str, Any]]:
-    job_id = self.request.id
-    start_time = time.time()
+    batch_job_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    # The document arrives as (filename, payload key) - the bytes are in the payload store
+    filename, payload = document
 
-    # Mark job as started in SQLite
-    if AUDIT_ENABLED and user_id:
+    document_service = get_document_service()
+    # The payload outlives a worker node that dies mid-conversion, for the redelivered task (acks_late)
+    with _open_document(payload) as file:
+        cache_key = conversion_cache.make_key(file, extract_tables, image_resolution_scale, picture_max_dim)
+        # A cached result is already in task-result form - it is returned without a model round trip
+        result_dict = conversion_cache.get(cache_key, filename)
+        if result_dict is None:
+            result = document_service.convert_document_task(
+                (filename, file),
+                extract_tables=extract_tables,
+                image_resolution_scale=image_resolution_scale,
+                picture_max_dim=picture_max_dim,
+            )
+            result_dict = result.model_dump(exclude_unset=True)
+            conversion_cache.put(cache_key, result_dict)
+
+    # LLM postprocessing for metadata extraction - a cached analysis of the same markdown
+    # is stored right away, otherwise it runs as its own task on the "llm" queue, so the
+    # conversion result does not wait for the LLM
+    markdown = result_dict.get("markdown")
+    if AUDIT_ENABLED and user_id and analyze_document_sync and markdown:
         try:
-            update_job_started(job_id)
+            analysis = llm_cache.get(llm_cache.make_key(PROMPT_VERSION, markdown))
+            if analysis:
+                update_job_analysis(self.request.id, **analysis)
+            else:
+                analyze_document_task.delay(self.request.id, markdown)
         except Exception as e:
-            logger.warning(f"Failed to update batch job started in audit: {e}")
+            logger.warning(f"Failed to dispatch LLM postprocessing: {e}")
+
+    return result_dict
+
 
+@celery_app.task(name="analyze_document")
+def analyze_document_task(job_id: str, markdown: str) -> None:
+    """LLM postprocessing of a converted document - stores summary, category, tags and language in its audit row."""
     try:
-        document_service = DocumentConverterService(document_converter=DoclingDocumentConversion())
-        results = document_service.convert_documents_task(
-            documents, extract_tables=extract_tables, image_resolution_scale=image_resolution_scale
-        )
+        analysis = analyze_document_sync(markdown)
+        if analysis:
+            llm_cache.put(llm_cache.make_key(PROMPT_VERSION, markdown), PROMPT_VERSION, asdict(analysis))
+            update_job_analysis(
+                job_id,
+                summary=analysis.summary,
+                category=analysis.category,
+                tags=analysis.tags,
+                language=analysis.language,
+            )
+            logger.info(f"LLM postprocessing done: category={analysis.category}, language={analysis.language}")
+    except Exception as e:
+        logger.warning(f"LLM postprocessing failed (non-fatal): {e}")
 
-        processing_time_ms = int((time.time() - start_time) * 1000)
 
-        # Mark job as completed in SQLite
-        if AUDIT_ENABLED and user_id:
-            try:
-                update_job_complete(
-                    job_id=job_id,
-                    status=Status.SUCCESS.value,
-                    processing_time_ms=processing_time_ms,
-                )
-            except Exception as e:
-                logger.warning(f"Failed to update batch job complete in audit: {e}")
+@celery_app.task(bind=True, name="collect_batch_results")
+def collect_batch_results(
+    self,
+    submitted_at: Optional[float] = None,
+    user_id: Optional[str] = None,
+) -> None:
+    """Chord callback of a batch job - runs once all of its documents are converted.
+
+    Each document of the batch is converted by its own convert_document task, so
+    free workers convert them in parallel; this task's id is the batch job id. The
+    documents' results stay with their own tasks - the API reads them through the
+    GroupResult saved under the batch job id.
+    """
+    if AUDIT_ENABLED and user_id:
+        try:
+            update_job_complete(
+                job_id=self.request.id,
+                status=Status.SUCCESS.value,
+                # Measured from submission on the API host, so this one needs the wall clock
+                processing_time_ms=max(0, int((time.time() - submitted_at) * 1000)) if submitted_at else None,
+            )
+        except Exception as e:
+            logger.warning(f"Failed to update batch job complete in audit: {e}")
 
-        return [result.model_dump(exclude_unset=True) for result in results]
 
-    except Exception as e:
-        processing_time_ms = int((time.time() - start_time) * 1000)
+@celery_app.task(name="batch_failed")
+def mark_batch_failed(request, exc, traceback, user_id: Optional[str] = None) -> None:
+    """Error callback of collect_batch_results - records a failed document conversion as a failed batch."""
+    if AUDIT_ENABLED and user_id:
+        try:
+            update_job_complete(job_id=request.id, status=Status.FAILURE.value, error=str(exc))
+        except Exception as e:
+            logger.warning(f"Failed to update batch job failure in audit: {e}")
 
-        # Mark job as failed in SQLite
-        if AUDIT_ENABLED and user_id:
-            try:
-                update_job_complete(
-                    job_id=job_id,
-                    status=Status.FAILURE.value,
-                    processing_time_ms=processing_time_ms,
-                    error=str(e),
-                )
-            except Exception as audit_error:
-                logger.warning(f"Failed to update batch job failure in audit: {audit_error}")
 
-        raise
+@celery_app.task(base=AuditedTask, name="convert_documents")
+def convert_documents_task(
+    documents: List[Tuple[str, Union[str, bytes]]],
+    extract_tables: bool = False,
+    image_resolution_scale: int = IMAGE_RESOLUTION_SCALE,
+    picture_max_dim: Optional[int] = None,
+    user_id: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    document_service = get_document_service()
+
+    with ExitStack() as stack:
+        # Documents arrive as (filename, payload key), like in convert_document
+        files = [(filename, stack.enter_context(_open_document(payload))) for filename, payload in documents]
+
+        # Only documents without a cached result are converted
+        cache_keys = [
+            conversion_cache.make_key(file, extract_tables, image_resolution_scale, picture_max_dim)
+            for _, file in files
+        ]
+        cached = [conversion_cache.get(key, filename) for key, (filename, _) in zip(cache_keys, files)]
+        misses = [document for document, hit in zip(files, cached) if hit is None]
+        converted = iter(
+            document_service.convert_documents_task(
+                misses,
+                extract_tables=extract_tables,
+                image_resolution_scale=image_resolution_scale,
+                picture_max_dim=picture_max_dim,
+            )
+            if misses
+            else []
+        )
+
+    # Each result is dumped once - cached results are already dicts
+    results = []
+    for key, hit in zip(cache_keys, cached):
+        if hit is None:
+            hit = next(converted).model_dump(exclude_unset=True)
+            conversion_cache.put(key, hit)
+        results.append(hit)
+    return results